@@ -0,0 +1,280 @@
+"""Execution backends for the module-3 warehouse scripts.
+
+The scripts describe tables and queries once and run them through a
+backend:
+
+- BigQueryBackend: the original behaviour (GCS external tables, native and
+  partitioned/clustered tables, dry-run byte estimates).
+- DuckDBBackend: runs everything locally against the downloaded
+  yellow_tripdata_2024-*.parquet files so the homework can be run and
+  benchmarked without GCP. External tables become read_parquet views,
+  regular tables native DuckDB tables, and partitioned/clustered tables
+  hive-partitioned Parquet sorted by the cluster columns.
+
+Select the backend with DWH_BACKEND=bigquery|duckdb (default: bigquery) or
+the scripts' --backend flag.
+"""
+import glob
+import json
+import os
+import shutil
+import tempfile
+import time
+
+
+class BigQueryBackend:
+    name = "bigquery"
+    dry_run = True
+
+    def __init__(self, project_id, dataset_id, bucket):
+        from google.cloud import bigquery
+
+        self.bigquery = bigquery
+        self.client = bigquery.Client()
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.bucket = bucket
+
+    def table(self, name):
+        return f"`{self.project_id}.{self.dataset_id}.{name}`"
+
+    def create_dataset(self):
+        dataset = self.bigquery.Dataset(f"{self.project_id}.{self.dataset_id}")
+        dataset.location = "US"
+        self.client.create_dataset(dataset, exists_ok=True)
+
+    def create_external_table(self, name, pattern):
+        external_config = self.bigquery.ExternalConfig(self.bigquery.SourceFormat.PARQUET)
+        external_config.source_uris = [f"gs://{self.bucket}/{pattern}"]
+        external_config.autodetect = True
+
+        table = self.bigquery.Table(f"{self.project_id}.{self.dataset_id}.{name}")
+        table.external_data_configuration = external_config
+        self.client.create_table(table, exists_ok=True)
+
+    def create_table_as(self, name, select_sql, partition_by=None, cluster_by=None):
+        query = f"CREATE OR REPLACE TABLE {self.table(name)}\n"
+        if partition_by:
+            query += f"PARTITION BY {partition_by}\n"
+        if cluster_by:
+            query += f"CLUSTER BY {', '.join(cluster_by)}\n"
+        query += f"AS\n{select_sql}"
+        self.client.query(query).result()
+
+    def list_source_files(self, pattern):
+        """(gs:// URI, generation) of every object in the bucket matching `pattern`."""
+        from google.cloud import storage
+
+        blobs = storage.Client().list_blobs(self.bucket, match_glob=pattern)
+        return [(f"gs://{self.bucket}/{blob.name}", blob.generation) for blob in blobs]
+
+    def append_files(self, name, external_name, uris, partition_by=None, cluster_by=None):
+        """Append rows from just `uris` of the external table, tagged with source_file.
+
+        Filtering on _FILE_NAME makes BigQuery read only those objects, so the
+        cost is proportional to the new files rather than the whole bucket.
+        """
+        select = f"SELECT *, _FILE_NAME AS source_file FROM {self.table(external_name)}"
+        ddl = f"CREATE TABLE IF NOT EXISTS {self.table(name)}\n"
+        if partition_by:
+            ddl += f"PARTITION BY {partition_by}\n"
+        if cluster_by:
+            ddl += f"CLUSTER BY {', '.join(cluster_by)}\n"
+        self.client.query(f"{ddl}AS\n{select} LIMIT 0").result()
+
+        job_config = self.bigquery.QueryJobConfig(query_parameters=[
+            self.bigquery.ArrayQueryParameter("files", "STRING", list(uris)),
+        ])
+        self.client.query(
+            f"INSERT INTO {self.table(name)}\n{select}\nWHERE _FILE_NAME IN UNNEST(@files)",
+            job_config=job_config,
+        ).result()
+
+    def query(self, sql):
+        return [dict(row.items()) for row in self.client.query(sql).result()]
+
+    def bytes_processed(self, sql):
+        """Bytes BigQuery would bill for `sql`, from a dry run."""
+        job_config = self.bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+        return self.client.query(sql, job_config=job_config).total_bytes_processed
+
+    def describe(self, name):
+        table = self.client.get_table(f"{self.project_id}.{self.dataset_id}.{name}")
+        return [(field.name, field.field_type) for field in table.schema]
+
+    def last_modified(self, name):
+        return self.client.get_table(f"{self.project_id}.{self.dataset_id}.{name}").modified.isoformat()
+
+    def partition_column(self, name):
+        partitioning = self.client.get_table(f"{self.project_id}.{self.dataset_id}.{name}").time_partitioning
+        if partitioning is None:
+            return None
+        return partitioning.field or "_PARTITIONTIME"
+
+
+class DuckDBBackend:
+    name = "duckdb"
+    dry_run = False
+
+    def __init__(self, dataset_id, path=None, data_dir=None, partition_dir=None):
+        import duckdb
+
+        self.duckdb = duckdb
+        self.dataset_id = dataset_id
+        self.path = path or os.getenv("DUCKDB_PATH", "taxi_dwh.duckdb")
+        self.data_dir = data_dir or os.getenv("DATA_DIR", ".")
+        self.partition_dir = partition_dir or os.getenv("PARTITION_DIR", "partitioned")
+        self.conn = duckdb.connect(self.path)
+        self.last_profile = None
+
+    def table(self, name):
+        return f"{self.dataset_id}.{name}"
+
+    def create_dataset(self):
+        self.conn.execute(f"CREATE SCHEMA IF NOT EXISTS {self.dataset_id}")
+
+    def create_external_table(self, name, pattern):
+        files = os.path.join(self.data_dir, pattern)
+        self.conn.execute(
+            f"CREATE OR REPLACE VIEW {self.table(name)} AS "
+            f"SELECT * FROM read_parquet('{files}', union_by_name = true)"
+        )
+        self._touch(name)
+
+    def create_table_as(self, name, select_sql, partition_by=None, cluster_by=None):
+        if not partition_by:
+            order = f" ORDER BY {', '.join(cluster_by)}" if cluster_by else ""
+            self.conn.execute(f"CREATE OR REPLACE TABLE {self.table(name)} AS {select_sql}{order}")
+            self._touch(name)
+            return
+
+        # Hive layout: one directory per partition value, rows sorted by the
+        # cluster columns so Parquet row-group stats prune like BQ blocks do
+        target = os.path.join(self.partition_dir, name)
+        staging = f"{target}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(self.partition_dir, exist_ok=True)
+        order = ", ".join(["partition_key", *(cluster_by or [])])
+        self.conn.execute(
+            f"COPY (SELECT *, {partition_by} AS partition_key FROM ({select_sql}) ORDER BY {order}) "
+            f"TO '{staging}' (FORMAT parquet, PARTITION_BY (partition_key), OVERWRITE true)"
+        )
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+        self.conn.execute(
+            f"CREATE OR REPLACE VIEW {self.table(name)} AS "
+            f"SELECT * EXCLUDE (partition_key) FROM "
+            f"read_parquet('{target}/**/*.parquet', hive_partitioning = true)"
+        )
+        self._touch(name)
+
+    def list_source_files(self, pattern):
+        """(path, mtime) of every file in DATA_DIR matching `pattern`; mtime stands in for the GCS generation."""
+        paths = sorted(glob.glob(os.path.join(self.data_dir, pattern)))
+        return [(path, os.stat(path).st_mtime_ns) for path in paths]
+
+    def append_files(self, name, external_name, uris, partition_by=None, cluster_by=None):
+        """Append rows from just `uris`, tagged with source_file.
+
+        Native DuckDB tables have no partitions; inserting each batch sorted by
+        the partition and cluster keys gives the zone maps the same pruning.
+        """
+        files = ", ".join(f"'{uri}'" for uri in uris)
+        select = (
+            "SELECT * EXCLUDE (filename), filename AS source_file "
+            f"FROM read_parquet([{files}], filename = true, union_by_name = true)"
+        )
+        order = ", ".join([*([partition_by] if partition_by else []), *(cluster_by or [])])
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table(name)} AS {select} LIMIT 0")
+        self.conn.execute(
+            f"INSERT INTO {self.table(name)} BY NAME {select}" + (f" ORDER BY {order}" if order else "")
+        )
+        self._touch(name)
+
+    def query(self, sql):
+        cursor = self.conn.execute(sql)
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def bytes_processed(self, sql):
+        """Bytes actually read from disk while running `sql` on a cold connection.
+
+        DuckDB has no dry run, so the query is executed with profiling on.
+        The profiler's own byte counter does not cover Parquet scans, so the
+        figure is the process's read() byte count around the query, which
+        covers both native table blocks and Parquet column chunks.
+        """
+        return self.profiled_query(sql)[1]
+
+    def profiled_query(self, sql):
+        """Run `sql` on a cold connection; return (rows, bytes read)."""
+        profile_path = os.path.join(tempfile.gettempdir(), f"duckdb_profile_{os.getpid()}.json")
+        conn = self.conn
+        if self.path != ":memory:":
+            # Reopen so the buffer pool is empty, as it would be for a new BQ job
+            self.conn.close()
+            conn = self.duckdb.connect(self.path, read_only=True)
+        try:
+            conn.execute("PRAGMA enable_profiling = 'json'")
+            conn.execute(f"SET profiling_output = '{profile_path}'")
+            before = _read_bytes()
+            start = time.perf_counter()
+            cursor = conn.execute(sql)
+            names = [d[0] for d in cursor.description]
+            rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+            elapsed = time.perf_counter() - start
+            after = _read_bytes()
+            conn.execute("PRAGMA disable_profiling")
+        finally:
+            if self.path != ":memory:":
+                conn.close()
+                self.conn = self.duckdb.connect(self.path)
+
+        # Queries answered from table statistics alone leave no profile
+        self.last_profile = {}
+        if os.path.exists(profile_path):
+            with open(profile_path) as fh:
+                self.last_profile = json.load(fh)
+            os.remove(profile_path)
+        self.last_profile["wall_seconds"] = elapsed
+        if before is None or after is None:
+            return rows, self.last_profile.get("total_bytes_read", 0)
+        return rows, after - before
+
+    def describe(self, name):
+        return [(row[0], row[1]) for row in self.conn.execute(f"DESCRIBE {self.table(name)}").fetchall()]
+
+    def _touch(self, name):
+        """Record a table's modification time, which DuckDB itself doesn't keep."""
+        self.conn.execute("CREATE TABLE IF NOT EXISTS main.table_versions (name VARCHAR PRIMARY KEY, modified BIGINT)")
+        self.conn.execute("INSERT OR REPLACE INTO main.table_versions VALUES (?, ?)", [name, time.time_ns()])
+
+    def last_modified(self, name):
+        """Latest of the recorded table version and the mtime of any Parquet file it may read."""
+        self.conn.execute("CREATE TABLE IF NOT EXISTS main.table_versions (name VARCHAR PRIMARY KEY, modified BIGINT)")
+        row = self.conn.execute("SELECT modified FROM main.table_versions WHERE name = ?", [name]).fetchone()
+        paths = [os.path.join(self.partition_dir, name), *glob.glob(os.path.join(self.data_dir, "*.parquet"))]
+        return max([row[0] if row else 0, *(os.stat(p).st_mtime_ns for p in paths if os.path.exists(p))])
+
+    def partition_column(self, name):
+        return None
+
+
+def _read_bytes():
+    try:
+        with open("/proc/self/io") as fh:
+            for line in fh:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def get_backend(name=None, project_id=None, dataset_id=None, bucket=None):
+    name = name or os.getenv("DWH_BACKEND", "bigquery")
+    if name == "bigquery":
+        return BigQueryBackend(project_id, dataset_id, bucket)
+    if name == "duckdb":
+        return DuckDBBackend(dataset_id)
+    raise ValueError(f"Unknown backend: {name}")
@@ -1,9 +1,7 @@
-import os
-from google.cloud import bigquery
+import argparse
 
-# Set up credentials
-credentials_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-client = bigquery.Client()
+from backends import get_backend
+from query_cache import QueryCache
 
 # Configuration
 PROJECT_ID = "your-gcp-project-id"  # Change to your actual project ID
@@ -11,16 +9,16 @@ DATASET_ID = "your_dataset_name"     # Change to your dataset name
 GCS_BUCKET = "your-bucket-name"      # Change to your GCS bucket name
 EXTERNAL_TABLE_ID = "yellow_trips_external"
 REGULAR_TABLE_ID = "yellow_trips"
+MANIFEST_TABLE_ID = "yellow_trips_manifest"
+SOURCE_PATTERN = "yellow_tripdata_2024-*.parquet"
 
 
-def create_dataset():
+def create_dataset(backend):
     """Create BigQuery dataset if it doesn't exist"""
     dataset_id = f"{PROJECT_ID}.{DATASET_ID}"
-    dataset = bigquery.Dataset(dataset_id)
-    dataset.location = "US"
     
     try:
-        dataset = client.create_dataset(dataset, exists_ok=True)
+        backend.create_dataset()
         print(f"✓ Dataset {dataset_id} created or already exists")
     except Exception as e:
         print(f"✗ Error creating dataset: {e}")
@@ -28,24 +26,13 @@ def create_dataset():
     return True
 
 
-def create_external_table():
+def create_external_table(backend):
     """Create external table pointing to GCS parquet files"""
     table_id = f"{PROJECT_ID}.{DATASET_ID}.{EXTERNAL_TABLE_ID}"
     
-    # GCS path pattern for all months (01-06)
-    gcs_uris = [
-        f"gs://{GCS_BUCKET}/yellow_tripdata_2024-*.parquet"
-    ]
-    
-    external_config = bigquery.ExternalConfig(bigquery.SourceFormat.PARQUET)
-    external_config.source_uris = gcs_uris
-    external_config.autodetect = True  # Auto-detect schema
-    
-    table = bigquery.Table(table_id)
-    table.external_data_configuration = external_config
-    
     try:
-        table = client.create_table(table, exists_ok=True)
+        # Path pattern for all months (01-06), in the bucket or DATA_DIR
+        backend.create_external_table(EXTERNAL_TABLE_ID, SOURCE_PATTERN)
         print(f"✓ External table {table_id} created")
         return True
     except Exception as e:
@@ -53,21 +40,18 @@ def create_external_table():
         return False
 
 
-def create_regular_table():
+def create_regular_table(backend):
     """Create regular (materialized) table from external table"""
-    external_table_id = f"{PROJECT_ID}.{DATASET_ID}.{EXTERNAL_TABLE_ID}"
     regular_table_id = f"{PROJECT_ID}.{DATASET_ID}.{REGULAR_TABLE_ID}"
     
     # SQL to create regular table from external table
     query = f"""
-    CREATE OR REPLACE TABLE `{regular_table_id}` AS
     SELECT *
-    FROM `{external_table_id}`
+    FROM {backend.table(EXTERNAL_TABLE_ID)}
     """
     
     try:
-        query_job = client.query(query)
-        query_job.result()  # Wait for query to complete
+        backend.create_table_as(REGULAR_TABLE_ID, query)
         print(f"✓ Regular table {regular_table_id} created")
         return True
     except Exception as e:
@@ -75,23 +59,87 @@ def create_regular_table():
         return False
 
 
-def describe_tables():
+def table_columns(backend, name):
+    """Column names of `name`, or None if the table doesn't exist."""
+    try:
+        return [column for column, _ in backend.describe(name)]
+    except Exception:
+        return None
+
+
+def create_regular_table_incremental(backend):
+    """Append only source files not yet in the regular table, tracked in a manifest"""
+    regular_table_id = f"{PROJECT_ID}.{DATASET_ID}.{REGULAR_TABLE_ID}"
+    regular = backend.table(REGULAR_TABLE_ID)
+    manifest = backend.table(MANIFEST_TABLE_ID)
+    
+    try:
+        backend.query(f"""
+        CREATE TABLE IF NOT EXISTS {manifest} (
+            file_name STRING,
+            generation INT64,
+            loaded_at TIMESTAMP
+        )
+        """)
+        columns = table_columns(backend, REGULAR_TABLE_ID)
+        if columns is None or "source_file" not in columns:
+            # Missing, or built by the full (non-incremental) mode: rows can't be
+            # traced to files, so start over and let the manifest describe the new table
+            if columns is not None:
+                print(f"{regular_table_id} has no source_file column, rebuilding it incrementally")
+                backend.query(f"DROP TABLE {regular}")
+            backend.query(f"DELETE FROM {manifest} WHERE TRUE")
+        
+        loaded = {
+            row["file_name"]: row["generation"]
+            for row in backend.query(f"SELECT file_name, generation FROM {manifest}")
+        }
+        
+        # New objects, plus ones overwritten since they were loaded (new generation)
+        pending = [(name, gen) for name, gen in backend.list_source_files(SOURCE_PATTERN)
+                   if loaded.get(name) != gen]
+        if not pending:
+            print(f"✓ Regular table {regular_table_id} is up to date")
+            return True
+        
+        names = ", ".join(f"'{name}'" for name, _ in pending)
+        replaced = [name for name, _ in pending if name in loaded]
+        # Also clears rows of "new" files appended by a run that died before
+        # writing the manifest, which would otherwise be loaded twice
+        if table_columns(backend, REGULAR_TABLE_ID) is not None:
+            backend.query(f"DELETE FROM {regular} WHERE source_file IN ({names})")
+        
+        backend.append_files(
+            REGULAR_TABLE_ID, EXTERNAL_TABLE_ID, [name for name, _ in pending],
+            partition_by="DATE(tpep_pickup_datetime)", cluster_by=["VendorID"],
+        )
+        
+        backend.query(f"DELETE FROM {manifest} WHERE file_name IN ({names})")
+        values = ", ".join(f"('{name}', {gen}, CURRENT_TIMESTAMP)" for name, gen in pending)
+        backend.query(f"INSERT INTO {manifest} (file_name, generation, loaded_at) VALUES {values}")
+        
+        print(f"✓ Appended {len(pending)} file(s) to {regular_table_id} "
+              f"({len(replaced)} replaced)")
+        return True
+    except Exception as e:
+        print(f"✗ Error updating regular table: {e}")
+        return False
+
+
+def describe_tables(backend):
     """Print table schemas"""
     try:
         # External table
-        external_table = client.get_table(f"{PROJECT_ID}.{DATASET_ID}.{EXTERNAL_TABLE_ID}")
         print(f"\nExternal table schema ({EXTERNAL_TABLE_ID}):")
-        print(external_table.schema)
+        print(backend.describe(EXTERNAL_TABLE_ID))
         
         # Regular table
-        regular_table = client.get_table(f"{PROJECT_ID}.{DATASET_ID}.{REGULAR_TABLE_ID}")
         print(f"\nRegular table schema ({REGULAR_TABLE_ID}):")
-        print(regular_table.schema)
+        print(backend.describe(REGULAR_TABLE_ID))
         
         # Row counts
-        count_query = f"SELECT COUNT(*) as row_count FROM `{PROJECT_ID}.{DATASET_ID}.{REGULAR_TABLE_ID}`"
-        count_job = client.query(count_query)
-        row_count = count_job.result().to_dataframe().iloc[0]['row_count']
+        count_query = f"SELECT COUNT(*) as row_count FROM {backend.table(REGULAR_TABLE_ID)}"
+        row_count = QueryCache(backend).run(count_query, [REGULAR_TABLE_ID]).rows[0]['row_count']
         print(f"\nTotal rows in {REGULAR_TABLE_ID}: {row_count:,}")
         
     except Exception as e:
@@ -99,18 +147,27 @@ def describe_tables():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the yellow taxi warehouse tables")
+    parser.add_argument("--backend", choices=["bigquery", "duckdb"], default=None,
+                        help="Execution backend (default: $DWH_BACKEND or bigquery)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Append only new/changed source files to a partitioned regular table")
+    args = parser.parse_args()
+    backend = get_backend(args.backend, PROJECT_ID, DATASET_ID, GCS_BUCKET)
+
     print("=" * 60)
-    print("Creating BigQuery Tables from Yellow Taxi Data")
+    print(f"Creating {backend.name} Tables from Yellow Taxi Data")
     print("=" * 60)
     
     # Step 1: Create dataset
-    if create_dataset():
+    if create_dataset(backend):
         # Step 2: Create external table
-        if create_external_table():
+        if create_external_table(backend):
             # Step 3: Create regular table
-            if create_regular_table():
+            create_regular = create_regular_table_incremental if args.incremental else create_regular_table
+            if create_regular(backend):
                 # Step 4: Describe tables
-                describe_tables()
+                describe_tables(backend)
                 print("\n✓ All tables created successfully!")
             else:
                 print("\n✗ Failed to create regular table")
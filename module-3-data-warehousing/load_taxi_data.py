@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 import requests
@@ -7,6 +8,8 @@ from google.cloud import storage
 from google.api_core.exceptions import NotFound, Forbidden
 import time
 
+from gcs_sync import sync_files
+
 
 # Change this to your bucket name
 BUCKET_NAME = "your-bucket-name"
@@ -29,16 +32,55 @@ DOWNLOAD_DIR = "."
 
 CHUNK_SIZE = 8 * 1024 * 1024
 
+# Source checksum of every downloaded file, so unchanged months aren't fetched again
+CATALOG_FILE = ".download_catalog.json"
+
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
-bucket = client.bucket(BUCKET_NAME)
+
+def load_catalog():
+    path = os.path.join(DOWNLOAD_DIR, CATALOG_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_catalog(catalog):
+    path = os.path.join(DOWNLOAD_DIR, CATALOG_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(catalog, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def remote_checksum(url):
+    """ETag of the source, else size + Last-Modified; None if the server won't say."""
+    try:
+        response = requests.head(url, timeout=30, allow_redirects=True)
+        response.raise_for_status()
+    except Exception:
+        return None
+    etag = response.headers.get("ETag")
+    if etag:
+        return etag.strip('"')
+    return f"{response.headers.get('Content-Length')}:{response.headers.get('Last-Modified')}"
 
 
-def download_file(month):
+def download_file(month, catalog=None):
     url = f"{BASE_URL}{month}.parquet"
-    file_path = os.path.join(DOWNLOAD_DIR, f"yellow_tripdata_2024-{month}.parquet")
+    file_name = f"yellow_tripdata_2024-{month}.parquet"
+    file_path = os.path.join(DOWNLOAD_DIR, file_name)
 
     try:
+        checksum = None
+        if catalog is not None:
+            checksum = remote_checksum(url)
+            entry = catalog.get(file_name)
+            if (checksum is not None and entry is not None and entry["checksum"] == checksum
+                    and os.path.exists(file_path) and os.path.getsize(file_path) == entry["size"]):
+                print(f"Unchanged, skipping download: {file_path}")
+                return file_path
+
         print(f"Downloading {url}...")
         response = requests.get(url, timeout=30)
         response.raise_for_status()  # Raise exception for bad status codes
@@ -46,6 +88,8 @@ def download_file(month):
         with open(file_path, 'wb') as f:
             f.write(response.content)
         
+        if catalog is not None and checksum is not None:
+            catalog[file_name] = {"checksum": checksum, "size": os.path.getsize(file_path)}
         print(f"Downloaded: {file_path}")
         return file_path
     except Exception as e:
@@ -82,43 +126,29 @@ def create_bucket(bucket_name):
         sys.exit(1)
 
 
-def verify_gcs_upload(blob_name):
-    return storage.Blob(bucket=bucket, name=blob_name).exists(client)
-
-
-def upload_to_gcs(file_path, max_retries=3):
-    blob_name = os.path.basename(file_path)
-    blob = bucket.blob(blob_name)
-    blob.chunk_size = CHUNK_SIZE
-
-    create_bucket(BUCKET_NAME)
-
+def upload_to_gcs(file_paths, max_retries=3):
+    """Upload new or changed files only; unchanged ones cost nothing but the bucket listing."""
+    files = {os.path.basename(path): path for path in file_paths}
     for attempt in range(max_retries):
-        try:
-            print(f"Uploading {file_path} to {BUCKET_NAME} (Attempt {attempt + 1})...")
-            blob.upload_from_filename(file_path)
-            print(f"Uploaded: gs://{BUCKET_NAME}/{blob_name}")
-
-            if verify_gcs_upload(blob_name):
-                print(f"Verification successful for {blob_name}")
-                return
-            else:
-                print(f"Verification failed for {blob_name}, retrying...")
-        except Exception as e:
-            print(f"Failed to upload {file_path} to GCS: {e}")
-
+        status = sync_files(client, BUCKET_NAME, files, workers=4, chunk_size=CHUNK_SIZE)
+        failed = {name: files[name] for name, result in status.items() if result == "failed"}
+        if not failed:
+            return
+        print(f"{len(failed)} uploads failed (attempt {attempt + 1}), retrying...")
+        files = failed
         time.sleep(5)
 
-    print(f"Giving up on {file_path} after {max_retries} attempts.")
+    print(f"Giving up on {sorted(files)} after {max_retries} attempts.")
 
 
 if __name__ == "__main__":
     create_bucket(BUCKET_NAME)
 
+    catalog = load_catalog()
     with ThreadPoolExecutor(max_workers=4) as executor:
-        file_paths = list(executor.map(download_file, MONTHS))
+        file_paths = list(executor.map(lambda month: download_file(month, catalog), MONTHS))
+    save_catalog(catalog)
 
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        executor.map(upload_to_gcs, filter(None, file_paths))  # Remove None values
+    upload_to_gcs(filter(None, file_paths))  # Remove None values
 
     print("All files processed and verified.")
\ No newline at end of file
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Convert downloaded NYC TLC CSVs to hive-partitioned Parquet for the local DuckDB target.
+
+Reads the `{taxi}/{year}/{taxi}_tripdata_{year}-{MM}.csv.gz` layout written by
+download_nyc_taxi.py and writes one zstd Parquet file per month to
+`{out}/{taxi}_tripdata/year={year}/month={MM}/data.parquet`, sorted by pickup time.
+The dbt sources read that tree with hive partitioning, so filters on year/month
+skip whole files and pickup filters skip row groups.
+
+Requires `duckdb`.
+
+Usage example:
+  python download_nyc_taxi.py --years 2019 2020
+  python convert_to_parquet.py --src nyc_taxi_data --out nyc_taxi_parquet
+"""
+import argparse
+import os
+import re
+import sys
+from pathlib import Path
+
+import duckdb
+
+FILENAME_RE = re.compile(r"^(yellow|green|fhv)_tripdata_(\d{4})-(\d{2})\.csv(\.gz)?$")
+
+# Column types after DuckDB's normalize_names (lowercased); autodetection gets
+# mostly-empty columns such as ehail_fee wrong
+TYPE_MAP = {
+    "vendorid": "INTEGER",
+    "ratecodeid": "INTEGER",
+    "pulocationid": "INTEGER",
+    "dolocationid": "INTEGER",
+    "passenger_count": "INTEGER",
+    "trip_type": "INTEGER",
+    "payment_type": "INTEGER",
+    "tpep_pickup_datetime": "TIMESTAMP",
+    "tpep_dropoff_datetime": "TIMESTAMP",
+    "lpep_pickup_datetime": "TIMESTAMP",
+    "lpep_dropoff_datetime": "TIMESTAMP",
+    "store_and_fwd_flag": "VARCHAR",
+    "trip_distance": "DOUBLE",
+    "fare_amount": "DOUBLE",
+    "extra": "DOUBLE",
+    "mta_tax": "DOUBLE",
+    "tip_amount": "DOUBLE",
+    "tolls_amount": "DOUBLE",
+    "ehail_fee": "DOUBLE",
+    "improvement_surcharge": "DOUBLE",
+    "total_amount": "DOUBLE",
+    "congestion_surcharge": "DOUBLE",
+    "airport_fee": "DOUBLE",
+    "dispatching_base_num": "VARCHAR",
+    "pickup_datetime": "TIMESTAMP",
+    "dropoff_datetime": "TIMESTAMP",
+    "sr_flag": "INTEGER",
+    "affiliated_base_number": "VARCHAR",
+}
+
+PICKUP_COLUMNS = ("tpep_pickup_datetime", "lpep_pickup_datetime", "pickup_datetime")
+
+
+def convert_file(con: duckdb.DuckDBPyConnection, src: Path, dest: Path) -> int:
+    columns = [
+        row[0] for row in
+        con.execute("DESCRIBE SELECT * FROM read_csv(?, normalize_names = true)", [str(src)]).fetchall()
+    ]
+    types = {name: TYPE_MAP[name] for name in columns if name in TYPE_MAP}
+    pickup = next((c for c in PICKUP_COLUMNS if c in columns), None)
+    order_by = f"ORDER BY {pickup}" if pickup else ""
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_suffix(".parquet.tmp")
+    con.execute(
+        f"""
+        COPY (
+            SELECT * FROM read_csv(?, normalize_names = true, types = {types!r})
+            {order_by}
+        ) TO '{tmp}' (FORMAT parquet, COMPRESSION zstd)
+        """,
+        [str(src)],
+    )
+    os.replace(tmp, dest)
+    return con.execute("SELECT count(*) FROM read_parquet(?)", [str(dest)]).fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert NYC TLC CSVs to hive-partitioned Parquet")
+    parser.add_argument("--src", default="./nyc_taxi_data", help="Directory written by download_nyc_taxi.py")
+    parser.add_argument("--out", default="./nyc_taxi_parquet", help="Output directory")
+    parser.add_argument("--force", action="store_true", help="Convert files whose Parquet is already up to date")
+    args = parser.parse_args()
+
+    src_dir = Path(args.src)
+    out_dir = Path(args.out)
+    files = sorted(p for p in src_dir.rglob("*") if FILENAME_RE.match(p.name))
+    if not files:
+        print(f"No TLC CSV files under {src_dir}")
+        sys.exit(1)
+
+    con = duckdb.connect()
+    for src in files:
+        taxi, year, month = FILENAME_RE.match(src.name).groups()[:3]
+        dest = out_dir / f"{taxi}_tripdata" / f"year={year}" / f"month={month}" / "data.parquet"
+        if not args.force and dest.exists() and dest.stat().st_mtime >= src.stat().st_mtime:
+            print(f"Up to date: {dest}")
+            continue
+        rows = convert_file(con, src, dest)
+        print(f"Converted {src} -> {dest} ({rows} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,58 @@
 #!/usr/bin/env python3
 """Download NYC TLC taxi data from DataTalksClub releases for given years/months.
 
+Files whose source is unchanged since they were downloaded (same ETag, or
+size and Last-Modified) are skipped; the checksums are kept in
+<out>/.download_catalog.json.
+
 Usage example:
   python download_nyc_taxi.py --years 2019 2020 --out data/
 """
 import argparse
+import json
 import os
 import subprocess
+import urllib.request
 from pathlib import Path
 
+CATALOG_FILE = ".download_catalog.json"
+
 
 def build_url(taxi: str, year: int, month: str) -> str:
     filename = f"{taxi}_tripdata_{year}-{month}.csv.gz"
     return f"https://github.com/DataTalksClub/nyc-tlc-data/releases/download/{taxi}/{filename}", filename
 
 
+def remote_checksum(url: str):
+    """ETag of the source, else size + Last-Modified; None if the server won't say."""
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method="HEAD"), timeout=30) as response:
+            headers = response.headers
+    except Exception:
+        return None
+    etag = headers.get("ETag")
+    if etag:
+        return etag.strip('"')
+    return f"{headers.get('Content-Length')}:{headers.get('Last-Modified')}"
+
+
+def load_catalog(out_dir: Path) -> dict:
+    path = out_dir / CATALOG_FILE
+    if not path.exists():
+        return {}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_catalog(out_dir: Path, catalog: dict):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / CATALOG_FILE
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, "w") as fh:
+        json.dump(catalog, fh, indent=2)
+    os.replace(tmp, path)
+
+
 def download_file(url: str, dest: Path, retries: int = 3) -> bool:
     dest.parent.mkdir(parents=True, exist_ok=True)
     cmd = ["wget", "-q", "-O", str(dest), url]
@@ -43,6 +81,7 @@ def main():
     args = parser.parse_args()
 
     out_dir = Path(args.out)
+    catalog = load_catalog(out_dir)
 
     for taxi in args.taxis:
         for year in args.years:
@@ -52,9 +91,19 @@ def main():
                 if args.skip_existing and dest.exists():
                     print(f"Skipping existing: {dest}")
                     continue
+                key = str(dest.relative_to(out_dir))
+                checksum = remote_checksum(url)
+                entry = catalog.get(key)
+                if (checksum is not None and entry is not None and entry["checksum"] == checksum
+                        and dest.exists() and dest.stat().st_size == entry["size"]):
+                    print(f"Unchanged, skipping: {dest}")
+                    continue
                 success = download_file(url, dest)
                 if not success:
                     print(f"Warning: failed to download {filename}")
+                elif checksum is not None:
+                    catalog[key] = {"checksum": checksum, "size": dest.stat().st_size}
+                    save_catalog(out_dir, catalog)
 
 
 if __name__ == "__main__":
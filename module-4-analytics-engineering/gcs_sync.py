@@ -0,0 +1,162 @@
+"""rsync-style upload of local files to a GCS bucket.
+
+The bucket prefix is listed once, and each blob's MD5 (or CRC32C, for
+composite objects that have no MD5) from that listing is compared with the
+local file's hash. Local hashes are computed by streaming the file and are
+cached in a JSON file keyed by path, mtime and size, so unchanged files are
+not re-read on the next run. Only new or changed files are uploaded, in
+parallel, after the plan has been printed. A steady-state rerun costs one
+list call and no data transfer.
+
+Modules 3 and 4 each keep a copy, since they run as standalone script
+directories; change both together.
+
+Requires `google-cloud-storage`. CRC32C is compared only when `google-crc32c`
+(normally pulled in by google-cloud-storage) can be imported; otherwise MD5 alone.
+"""
+import base64
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+CACHE_FILE = ".gcs_sync_cache.json"
+HASH_BLOCK = 8 * 1024 * 1024
+
+
+def _crc32c():
+    try:
+        import google_crc32c
+    except ImportError:
+        return None
+    return google_crc32c.Checksum()
+
+
+def file_hashes(path: Path) -> dict:
+    """Base64 MD5 and CRC32C of a file, the encoding GCS reports them in."""
+    md5 = hashlib.md5()
+    crc = _crc32c()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(HASH_BLOCK), b""):
+            md5.update(block)
+            if crc is not None:
+                crc.update(block)
+    return {
+        "md5": base64.b64encode(md5.digest()).decode(),
+        "crc32c": base64.b64encode(crc.digest()).decode() if crc is not None else None,
+    }
+
+
+class HashCache:
+    """Local file hashes, reused while a file's mtime and size are unchanged."""
+
+    def __init__(self, path: str = CACHE_FILE):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as fh:
+                self.entries = json.load(fh)
+        self.hashed = 0
+
+    def get(self, path: Path) -> dict:
+        stat = path.stat()
+        key = str(path.resolve())
+        entry = self.entries.get(key)
+        if entry is None or entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            entry = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, **file_hashes(path)}
+            self.entries[key] = entry
+            self.hashed += 1
+        return entry
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(self.entries, fh)
+        os.replace(tmp, self.path)
+
+
+def _same(local: dict, blob) -> bool:
+    if blob.size != local["size"]:
+        return False
+    if blob.md5_hash:
+        return blob.md5_hash == local["md5"]
+    if blob.crc32c and local["crc32c"]:
+        return blob.crc32c == local["crc32c"]
+    return False
+
+
+def plan_sync(client, bucket_name: str, files: dict, prefix: str = "", cache: HashCache = None) -> list:
+    """[(action, local path, blob name, size)] with action 'new', 'changed' or 'unchanged'.
+
+    `files` maps blob names to local paths. The bucket is listed once under
+    the common prefix of all blob names.
+    """
+    cache = cache or HashCache()
+    if not prefix:
+        prefix = os.path.commonprefix(list(files))
+    remote = {
+        blob.name: blob
+        for blob in client.list_blobs(bucket_name, prefix=prefix,
+                                      fields="items(name,size,md5Hash,crc32c),nextPageToken")
+    }
+    plan = []
+    for name, path in sorted(files.items()):
+        local = cache.get(Path(path))
+        blob = remote.get(name)
+        if blob is None:
+            action = "new"
+        elif _same(local, blob):
+            action = "unchanged"
+        else:
+            action = "changed"
+        plan.append((action, Path(path), name, local["size"]))
+    return plan
+
+
+def print_plan(plan: list, bucket_name: str):
+    transfer = [step for step in plan if step[0] != "unchanged"]
+    counts = {action: sum(1 for step in plan if step[0] == action) for action in ("new", "changed", "unchanged")}
+    print(f"Sync plan for gs://{bucket_name}: {counts['new']} new, {counts['changed']} changed, "
+          f"{counts['unchanged']} unchanged ({sum(step[3] for step in transfer) / 1024**2:,.1f} MB to upload)")
+    for action, path, name, size in transfer:
+        marker = "+" if action == "new" else "~"
+        print(f"  {marker} {path} -> gs://{bucket_name}/{name} ({action}, {size / 1024**2:,.1f} MB)")
+
+
+def _upload(bucket, path: Path, name: str, chunk_size: int = None):
+    blob = bucket.blob(name, chunk_size=chunk_size)
+    # The client verifies the upload against the checksum it computes locally
+    blob.upload_from_filename(str(path), checksum="crc32c")
+    return name
+
+
+def sync_files(client, bucket_name: str, files: dict, prefix: str = "", workers: int = 8,
+               dry_run: bool = False, cache_path: str = CACHE_FILE, chunk_size: int = None) -> dict:
+    """Upload new and changed files; return {blob name: 'uploaded' | 'unchanged' | 'failed' | 'planned'}."""
+    cache = HashCache(cache_path)
+    plan = plan_sync(client, bucket_name, files, prefix, cache)
+    cache.save()
+    print_plan(plan, bucket_name)
+    if cache.hashed:
+        print(f"Hashed {cache.hashed} local files (others reused from {cache_path})")
+
+    status = {name: "unchanged" for action, _, name, _ in plan if action == "unchanged"}
+    transfer = [step for step in plan if step[0] != "unchanged"]
+    if dry_run:
+        status.update({name: "planned" for _, _, name, _ in transfer})
+        return status
+
+    bucket = client.bucket(bucket_name)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_upload, bucket, path, name, chunk_size): (path, name) for _, path, name, _ in transfer}
+        for future in as_completed(futures):
+            path, name = futures[future]
+            try:
+                future.result()
+                status[name] = "uploaded"
+                print(f"Uploaded {path} -> gs://{bucket_name}/{name}")
+            except Exception as e:
+                status[name] = "failed"
+                print(f"Upload failed for {path}: {e}")
+    return status
@@ -0,0 +1,47 @@
+{#
+    Start of the reprocessing window for windowed incremental models:
+    the latest value of `column` already in {{ this }}, minus var('lookback_days').
+
+    Rows that arrive late, up to the lookback, are picked up again, and
+    reprocessing stays bounded to the window instead of all history.
+    Backfills older than the window need a --full-refresh.
+
+    In an incremental run the window start is fetched once with run_query and
+    returned as a timestamp literal, so BigQuery can prune partitions on it
+    (it does not prune on a subquery). Pass subquery=true for places rendered
+    at parse time, such as incremental_predicates in config(), where run_query
+    is not available.
+
+    Usage: where pickup_datetime >= {{ incremental_window_start('pickup_datetime') }}
+    Returns: a timestamp literal, or a scalar subquery yielding one
+             (truncated to the month when month_start is true)
+#}
+
+{% macro incremental_window_start(column='pickup_datetime', month_start=false, subquery=false) %}
+    {%- set days = var('lookback_days') -%}
+    {%- set window_sql -%}
+    select
+    {%- if target.type == 'bigquery' %}
+        {%- if month_start %}
+        timestamp(date_trunc(date_sub(date(max({{ column }})), interval {{ days }} day), month))
+        {%- else %}
+        timestamp_sub(timestamp(max({{ column }})), interval {{ days }} day)
+        {%- endif %}
+    {%- else %}
+        {%- if month_start %}
+        date_trunc('month', max({{ column }}) - interval '{{ days }} days')
+        {%- else %}
+        max({{ column }}) - interval '{{ days }} days'
+        {%- endif %}
+    {%- endif %}
+    from {{ this }}
+    {%- endset -%}
+
+    {%- if not subquery and execute and is_incremental() -%}
+        {%- set start = run_query(window_sql).columns[0].values()[0] -%}
+        {%- if start is not none -%}
+            {{ return("timestamp '" ~ start ~ "'") }}
+        {%- endif -%}
+    {%- endif -%}
+    ({{ window_sql }})
+{%- endmacro %}
@@ -1,9 +1,26 @@
+{{
+  config(
+    materialized='incremental',
+    unique_key='trip_id',
+    incremental_strategy='merge',
+    incremental_predicates=[
+      "DBT_INTERNAL_DEST.pickup_datetime >= " ~ incremental_window_start('pickup_datetime', subquery=true)
+    ],
+    on_schema_change='append_new_columns'
+  )
+}}
+
 -- Enrich and deduplicate trip data
 -- Demonstrates enrichment and surrogate key generation
 -- Note: Data quality analysis available in analyses/trips_data_quality.sql
+-- Incremental runs only dedup the lookback window: duplicates share pickup_datetime,
+-- so a late duplicate of an already loaded trip falls inside the window too
 
 with unioned as (
     select * from {{ ref('int_trips_unioned') }}
+    {% if is_incremental() %}
+    where pickup_datetime >= {{ incremental_window_start('pickup_datetime') }}
+    {% endif %}
 ),
 
 payment_types as (
@@ -1,3 +1,7 @@
+-- A view: incremental runs of int_trips push their pickup window filter down
+-- through the union into the staging models instead of scanning a copy of all history
+{{ config(materialized='view') }}
+
 -- Union green and yellow taxi data into a single dataset
 -- Demonstrates how to combine data from multiple sources with slightly different schemas
 
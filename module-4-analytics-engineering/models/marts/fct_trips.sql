@@ -3,6 +3,11 @@
     materialized='incremental',
     unique_key='trip_id',
     incremental_strategy='merge',
+    partition_by={'field': 'pickup_datetime', 'data_type': 'timestamp', 'granularity': 'day'} if target.type == 'bigquery' else none,
+    cluster_by=['pickup_location_id', 'dropoff_location_id'] if target.type == 'bigquery' else none,
+    incremental_predicates=[
+      "DBT_INTERNAL_DEST.pickup_datetime >= " ~ incremental_window_start('pickup_datetime', subquery=true)
+    ],
     on_schema_change='append_new_columns'  )
 }}
 
@@ -56,6 +61,9 @@ left join {{ ref('dim_zones') }} as dz
     on trips.dropoff_location_id = dz.location_id
 
 {% if is_incremental() %}
-  -- Only process new trips based on pickup datetime
-  where trips.pickup_datetime > (select max(pickup_datetime) from {{ this }})
+  -- Only process trips in the lookback window, compared against a literal so
+  -- BigQuery prunes int_trips' partitions. The merge predicate above limits the
+  -- target rows matched to the same window, but as a config value it is rendered
+  -- at parse time and stays a subquery, so BigQuery still scans the whole target
+  where trips.pickup_datetime >= {{ incremental_window_start('pickup_datetime') }}
 {% endif %}
\ No newline at end of file
@@ -1,3 +1,13 @@
+{{
+  config(
+    materialized='incremental',
+    incremental_strategy='insert_overwrite' if target.type == 'bigquery' else 'delete+insert',
+    unique_key=none if target.type == 'bigquery' else ['pickup_zone', 'revenue_month', 'service_type'],
+    partition_by={'field': 'revenue_month', 'data_type': 'date', 'granularity': 'month'} if target.type == 'bigquery' else none,
+    on_schema_change='append_new_columns'
+  )
+}}
+
 -- Data mart for monthly revenue analysis by pickup zone and service type
 -- This aggregation is optimized for business reporting and dashboards
 -- Enables analysis of revenue trends across different zones and taxi types
@@ -26,4 +36,9 @@ select
     avg(trip_distance) as avg_monthly_trip_distance
 
 from {{ ref('fct_trips') }}
+{% if is_incremental() %}
+-- Only rebuild the months fct_trips' lookback window can have touched; BigQuery
+-- overwrites exactly those month partitions, other targets delete+insert their rows
+where pickup_datetime >= {{ incremental_window_start('revenue_month', month_start=true) }}
+{% endif %}
 group by pickup_zone, revenue_month, service_type
\ No newline at end of file
@@ -1,5 +1,9 @@
 with source as (
     select * from {{ source('raw', 'green_tripdata') }}
+    {% if target.type == 'duckdb' and target.name == 'dev' %}
+    -- Hive partition pruning: only open the files for the dev date range below
+    where year >= 2019 and year < 2021
+    {% endif %}
 ),
 
 renamed as (
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Run `dbt build` and report per-model runtimes from target/run_results.json.
+
+Extra arguments after `--` are passed to dbt. With --results-only the
+report is printed for the last run without running dbt again.
+
+Usage example:
+  python time_dbt_build.py --target local
+  python time_dbt_build.py --target local -- --select +fct_trips
+  python time_dbt_build.py --results-only
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+def load_results(path: Path) -> list:
+    with open(path) as fh:
+        results = json.load(fh)["results"]
+    rows = []
+    for result in results:
+        # model.<project>.<name>, test.<project>.<name>.<hash>, ...
+        kind, _, name = result["unique_id"].split(".")[:3]
+        rows.append({
+            "name": name,
+            "kind": kind,
+            "status": result["status"],
+            "seconds": result.get("execution_time") or 0.0,
+            "rows": (result.get("adapter_response") or {}).get("rows_affected"),
+        })
+    return sorted(rows, key=lambda row: row["seconds"], reverse=True)
+
+
+def print_report(rows: list, wall: float = None):
+    width = max((len(row["name"]) for row in rows), default=10)
+    print(f"{'node':<{width}}  {'type':<8} {'status':<8} {'seconds':>9} {'rows':>12}")
+    for row in rows:
+        affected = "" if row["rows"] is None else f"{row['rows']:,}"
+        print(f"{row['name']:<{width}}  {row['kind']:<8} {row['status']:<8} {row['seconds']:>9.2f} {affected:>12}")
+    total = sum(row["seconds"] for row in rows)
+    models = [row for row in rows if row["kind"] == "model"]
+    print(f"\n{len(models)} models in {sum(r['seconds'] for r in models):.1f}s, "
+          f"{len(rows)} nodes in {total:.1f}s" + (f", wall clock {wall:.1f}s" if wall is not None else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time a dbt build per model")
+    parser.add_argument("--target", default=None, help="dbt target (e.g. local)")
+    parser.add_argument("--project-dir", default=str(Path(__file__).resolve().parent), help="dbt project directory")
+    parser.add_argument("--results-only", action="store_true", help="Only report the last run_results.json")
+    parser.add_argument("dbt_args", nargs="*", help="Extra arguments for dbt (after --)")
+    args = parser.parse_args()
+
+    project_dir = Path(args.project_dir)
+    wall = None
+    if not args.results_only:
+        cmd = ["dbt", "build", "--project-dir", str(project_dir)]
+        if args.target:
+            cmd += ["--target", args.target]
+        cmd += args.dbt_args
+        print("Running:", " ".join(cmd))
+        start = time.perf_counter()
+        rc = subprocess.call(cmd, cwd=project_dir)
+        wall = time.perf_counter() - start
+        if rc != 0:
+            print(f"dbt exited with {rc}; reporting the nodes that ran")
+
+    results_path = project_dir / "target" / "run_results.json"
+    if not results_path.exists():
+        print(f"No {results_path}; run dbt first")
+        sys.exit(1)
+    print_report(load_results(results_path), wall)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 """Upload downloaded NYC TLC files to GCS and load into BigQuery.
 
-Workflow per file:
-  - upload local .csv.gz to gs://{bucket}/{taxi}/{year}/{filename}
+Workflow:
+  - sync local .csv.gz files to gs://{bucket}/{taxi}/{year}/{filename}, uploading
+    only new or changed files (see gcs_sync.py)
+
+Then per file:
   - load into staging table `{dataset}.{taxi}_tripdata_{year}_{month}` (autodetect CSV)
   - create/merge into `{dataset}.{taxi}_tripdata` using MD5 unique id
 
@@ -16,7 +19,8 @@ import re
 from pathlib import Path
 from google.cloud import storage, bigquery
 from google.api_core.exceptions import NotFound
-import sys
+
+from gcs_sync import sync_files
 
 
 FILENAME_RE = re.compile(r"^(yellow|green|fhv)_tripdata_(\d{4})-(\d{2})\.csv(\.gz)?$")
@@ -93,18 +97,6 @@ def create_dataset_if_not_exists(bq_client: bigquery.Client, project: str, datas
         raise
 
 
-def upload_file(storage_client: storage.Client, bucket_name: str, src_path: Path, dst_path: str) -> str:
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(dst_path)
-    if blob.exists():
-        print(f"GCS exists, skipping upload: gs://{bucket_name}/{dst_path}")
-        return f"gs://{bucket_name}/{dst_path}"
-
-    print(f"Uploading {src_path} -> gs://{bucket_name}/{dst_path}")
-    blob.upload_from_filename(str(src_path))
-    return f"gs://{bucket_name}/{dst_path}"
-
-
 def load_csv_to_bq(bq_client: bigquery.Client, gcs_uri: str, project: str, dataset: str, table_id: str):
     table_ref = f"{project}.{dataset}.{table_id}"
     job_config = bigquery.LoadJobConfig()
@@ -198,6 +190,8 @@ def main():
     parser.add_argument('--skip-upload', action='store_true', help='Skip uploading and only run BQ load from existing GCS URIs')
     parser.add_argument('--gcs-prefix', default='', help='Optional prefix under bucket when skipping upload (e.g. taxi/)')
     parser.add_argument('--mode', choices=['as-is', 'merge'], default='as-is', help='Load mode: "as-is" loads each file into its own table; "merge" runs dedup/merge into consolidated table')
+    parser.add_argument('--upload-workers', type=int, default=8, help='Parallel uploads')
+    parser.add_argument('--dry-run', action='store_true', help='Print the upload plan and exit')
     args = parser.parse_args()
 
     storage_client = storage.Client()
@@ -219,22 +213,30 @@ def main():
         print("No csv files found in local dir")
         raise SystemExit(1)
 
+    targets = {}
     for f in files:
-        fname = f.name
-        m = FILENAME_RE.match(fname)
+        m = FILENAME_RE.match(f.name)
         if not m:
-            print(f"Skipping unrecognized filename: {fname}")
+            print(f"Skipping unrecognized filename: {f.name}")
             continue
         taxi, year, month, _ = m.groups()
-        dst_path = f"{taxi}/{year}/{fname}"
+        targets[f"{taxi}/{year}/{f.name}"] = f
+
+    upload_status = {}
+    if not args.skip_upload:
+        upload_status = sync_files(storage_client, args.bucket, targets,
+                                   workers=args.upload_workers, dry_run=args.dry_run)
+        print()
+    if args.dry_run:
+        return
+
+    for dst_path, f in targets.items():
+        fname = f.name
+        taxi, year, month, _ = FILENAME_RE.match(fname).groups()
         gcs_uri = f"gs://{args.bucket}/{dst_path}"
 
-        if not args.skip_upload:
-            try:
-                upload_file(storage_client, args.bucket, f, dst_path)
-            except Exception as e:
-                print(f"Upload failed for {f}: {e}")
-                continue
+        if upload_status.get(dst_path) == "failed":
+            continue
 
         # Load to staging table
         staging_table = f"{taxi}_tripdata_{year}_{month}"
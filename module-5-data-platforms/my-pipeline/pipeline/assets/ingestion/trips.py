@@ -92,13 +92,126 @@ columns:
 # - Put dependencies in the nearest `requirements.txt` (this template has one at the pipeline root).
 # Docs: https://getbruin.com/docs/bruin/assets/python
 
+import io
 import os
 import json
+import tempfile
 import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import requests
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 
+# TLC endpoint base URL
+BASE_URL = 'https://d37ci6vzurychx.cloudfront.net/trip-data/'
+
+# Pickup timestamp column per taxi type (raw TLC names, renamed in staging)
+PICKUP_COLUMNS = {
+    'yellow': 'tpep_pickup_datetime',
+    'green': 'lpep_pickup_datetime',
+}
+
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def read_window(path, pickup_column, start, end):
+    """
+    Read only the trips with start <= pickup < end from a local Parquet file.
+
+    The filter is pushed down into the Parquet scan: row groups whose pickup
+    min/max statistics fall outside the window are skipped without being
+    decoded, and rows outside it are dropped batch by batch, so out-of-window
+    trips are never collected in memory.
+    """
+    dataset = ds.dataset(path, format='parquet')
+    window = (ds.field(pickup_column) >= start) & (ds.field(pickup_column) < end)
+    return dataset.to_table(filter=window).to_pandas()
+
+
+class HTTPRangeFile(io.RawIOBase):
+    """Seekable read-only view of a remote file backed by HTTP range requests."""
+
+    def __init__(self, url, size):
+        self.url = url
+        self.size = size
+        self.pos = 0
+        self.session = requests.Session()
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        else:
+            self.pos = self.size + offset
+        return self.pos
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.size, self.pos + size)
+        if self.pos >= end:
+            return b''
+        response = self.session.get(self.url, headers={'Range': f'bytes={self.pos}-{end - 1}'}, timeout=30)
+        response.raise_for_status()
+        data = response.content
+        self.pos += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def open_remote_parquet(url):
+    """
+    Open a remote Parquet file through HTTP range requests.
+
+    Returns None if the file doesn't exist or the server can't serve byte
+    ranges, in which case the caller downloads it instead.
+    """
+    head = requests.head(url, timeout=30, allow_redirects=True)
+    if head.status_code != 200 or head.headers.get('Accept-Ranges') != 'bytes':
+        return None
+    source = HTTPRangeFile(head.url, int(head.headers['Content-Length']))
+    return pq.ParquetFile(source, pre_buffer=True)
+
+
+def plan_row_groups(metadata, pickup_column, start, end):
+    """Row groups whose footer pickup min/max statistics overlap [start, end)."""
+    index = metadata.schema.to_arrow_schema().get_field_index(pickup_column)
+    planned = []
+    for i in range(metadata.num_row_groups):
+        statistics = metadata.row_group(i).column(index).statistics if index >= 0 else None
+        if statistics is None or not statistics.has_min_max:
+            planned.append(i)
+        elif statistics.min < end and statistics.max >= start:
+            planned.append(i)
+    return planned
+
+
+def read_window_remote(parquet, pickup_column, start, end):
+    """
+    Read only the trips with start <= pickup < end from a remote Parquet file.
+
+    The footer is read first, and only the row groups whose pickup statistics
+    overlap the window are fetched, so a one-day run downloads roughly one
+    day of data rather than the whole month.
+    """
+    groups = plan_row_groups(parquet.metadata, pickup_column, start, end)
+    table = parquet.read_row_groups(groups)
+    window = (ds.field(pickup_column) >= start) & (ds.field(pickup_column) < end)
+    return table.filter(window).to_pandas()
+
 
 # TODO: Only implement `materialize()` if you are using Bruin Python materialization.
 # If you choose the manual-write approach (no `materialization:` block), remove this function and implement ingestion
@@ -108,7 +221,8 @@ def materialize():
     Fetch NYC Taxi trip data from TLC public endpoint for the requested period and taxi types.
 
     Uses Bruin runtime context:
-    - BRUIN_START_DATE / BRUIN_END_DATE: Date range to fetch (YYYY-MM-DD)
+    - BRUIN_START_DATE / BRUIN_END_DATE: Date range to fetch (YYYY-MM-DD, end day inclusive,
+      matching the staging `< end_datetime` filter); only trips picked up in that window are returned
     - BRUIN_VARS: Pipeline variables (JSON), including taxi_types array
 
     Returns:
@@ -123,18 +237,17 @@ def materialize():
     # Parse dates
     start_date = datetime.strptime(start_date_str, '%Y-%m-%d') if start_date_str else datetime(2024, 1, 1)
     end_date = datetime.strptime(end_date_str, '%Y-%m-%d') if end_date_str else datetime.now()
+    # Half-open window [start, end) covering the whole end day
+    window_end = datetime(end_date.year, end_date.month, end_date.day) + timedelta(days=1)
     
     # Get taxi types from pipeline variables (default: yellow, green)
     taxi_types = bruin_vars.get('taxi_types', ['yellow', 'green'])
     
-    # TLC endpoint base URL
-    base_url = 'https://d37ci6vzurychx.cloudfront.net/trip-data/'
-    
     # Generate list of (year, month, taxi_type) tuples to fetch
-    current = start_date
+    current = datetime(start_date.year, start_date.month, 1)
     fetch_list = []
     
-    while current <= end_date:
+    while current < window_end:
         year = current.year
         month = current.month
         for taxi_type in taxi_types:
@@ -148,21 +261,29 @@ def materialize():
     for year, month, taxi_type in fetch_list:
         # Construct filename and URL
         filename = f'{taxi_type}_tripdata_{year:04d}-{month:02d}.parquet'
-        url = f'{base_url}{filename}'
+        url = f'{BASE_URL}{filename}'
         
         try:
             print(f'Fetching {url}...')
-            # Download and read parquet file
-            response = requests.get(url, timeout=30)
-            if response.status_code == 200:
-                # Read parquet from bytes
-                df = pd.read_parquet(pd.io.common.BytesIO(response.content))
-                # Add extraction metadata
-                df['extracted_at'] = extraction_timestamp
-                dataframes.append(df)
-                print(f'  ✓ Loaded {len(df)} rows')
+            parquet = open_remote_parquet(url)
+            if parquet is not None:
+                df = read_window_remote(parquet, PICKUP_COLUMNS[taxi_type], start_date, window_end)
             else:
-                print(f'  ✗ Failed: HTTP {response.status_code} (file may not exist)')
+                # No range support: stream the file to disk so the full month never sits in memory
+                with requests.get(url, timeout=30, stream=True) as response, \
+                        tempfile.NamedTemporaryFile(suffix='.parquet') as tmp:
+                    if response.status_code != 200:
+                        print(f'  ✗ Failed: HTTP {response.status_code} (file may not exist)')
+                        continue
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        tmp.write(chunk)
+                    tmp.flush()
+
+                    df = read_window(tmp.name, PICKUP_COLUMNS[taxi_type], start_date, window_end)
+            # Add extraction metadata
+            df['extracted_at'] = extraction_timestamp
+            dataframes.append(df)
+            print(f'  ✓ Loaded {len(df)} rows in window')
         except Exception as e:
             print(f'  ✗ Error fetching {filename}: {str(e)}')
     
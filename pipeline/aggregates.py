@@ -0,0 +1,173 @@
+"""Streaming aggregation sinks fed by the ingest scripts.
+
+MonthlyZoneRevenue keeps the running state behind module-4's
+fct_monthly_zone_revenue while chunks stream through. Sums and counts are
+kept separately from averages so partial states stay mergeable: each
+source file owns its own rows in the summary table, re-ingesting a file
+only replaces those rows, and the `<table>_monthly` view merges them.
+Trip counts per payment type go to `<table>_payment_mix` the same way, and
+every flush stamps `<table>_loads`, so readers (serve.py) can tell when the
+aggregates changed. Sampled chunks (see sample.py) are scaled back up by
+their sample_weight.
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect, text
+
+from sample import WEIGHT_COLUMN
+from zones import ZoneLookup
+
+# source column -> summary column, same names as fct_monthly_zone_revenue
+SUM_COLUMNS = {
+    "fare_amount": "revenue_monthly_fare",
+    "extra": "revenue_monthly_extra",
+    "mta_tax": "revenue_monthly_mta_tax",
+    "tip_amount": "revenue_monthly_tip_amount",
+    "tolls_amount": "revenue_monthly_tolls_amount",
+    "ehail_fee": "revenue_monthly_ehail_fee",
+    "improvement_surcharge": "revenue_monthly_improvement_surcharge",
+    "total_amount": "revenue_monthly_total_amount",
+}
+
+MEAN_COLUMNS = {
+    "passenger_count": "avg_monthly_passenger_count",
+    "trip_distance": "avg_monthly_trip_distance",
+}
+
+
+class MonthlyZoneRevenue:
+
+    def __init__(self, service_type, pickup_col, source, zones=None,
+                 location_col="PULocationID"):
+        self.service_type = service_type
+        self.pickup_col = pickup_col
+        self.location_col = location_col
+        self.source = source
+        self.zones = zones or ZoneLookup.from_csv()
+        self.state = None
+        self.payments = None
+
+    def update(self, df):
+        months = df[self.pickup_col].to_numpy(dtype="datetime64[ns]").astype("datetime64[M]")
+        keep = ~np.isnat(months)
+        if WEIGHT_COLUMN in df:
+            weight = df[WEIGHT_COLUMN].to_numpy(dtype=np.float64)[keep]
+        else:
+            weight = np.ones(keep.sum(), dtype=np.int64)
+
+        part = {
+            "location_id": df[self.location_col].to_numpy(dtype=np.int64, na_value=-1)[keep],
+            "revenue_month": months[keep],
+            "total_monthly_trips": weight,
+        }
+        for col, name in SUM_COLUMNS.items():
+            values = df[col].to_numpy(dtype=np.float64, na_value=0.0)[keep] if col in df else 0.0
+            part[name] = values * weight
+        for col in MEAN_COLUMNS:
+            if col not in df:
+                # Not loaded (e.g. --columns): no observations, so the view's average is NULL
+                part[f"{col}_sum"] = np.zeros(keep.sum())
+                part[f"{col}_count"] = np.zeros(keep.sum())
+                continue
+            values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)[keep]
+            part[f"{col}_sum"] = np.nan_to_num(values) * weight
+            part[f"{col}_count"] = (~np.isnan(values)) * weight
+
+        if "payment_type" in df:
+            payments = pd.DataFrame({
+                "location_id": part["location_id"],
+                "revenue_month": part["revenue_month"],
+                "payment_type": df["payment_type"].to_numpy(dtype=np.int64, na_value=-1)[keep],
+                "trips": weight,
+                "total_amount": part["revenue_monthly_total_amount"],
+            }).groupby(["location_id", "revenue_month", "payment_type"]).sum()
+            self.payments = payments if self.payments is None else self.payments.add(payments, fill_value=0)
+
+        part = pd.DataFrame(part).groupby(["location_id", "revenue_month"]).sum()
+        self.state = part if self.state is None else self.state.add(part, fill_value=0)
+
+    def _by_zone(self, state, keys):
+        state = state.reset_index()
+        zone = self.zones.zone(state.pop("location_id"))
+        state.insert(0, "pickup_zone", zone.astype(object))
+        state["pickup_zone"] = state["pickup_zone"].fillna("Unknown Zone")
+        return state.groupby(["pickup_zone", "revenue_month"] + keys, as_index=False).sum()
+
+    def result(self):
+        """Collapse the running state to one row per (pickup_zone, revenue_month)."""
+        result = self._by_zone(self.state, [])
+        counts = ["total_monthly_trips"] + [f"{col}_count" for col in MEAN_COLUMNS]
+        result[counts] = result[counts].round().astype(np.int64)
+        result.insert(2, "service_type", self.service_type)
+        result.insert(3, "source", self.source)
+        result["revenue_month"] = result["revenue_month"].astype("datetime64[s]").dt.date
+        return result
+
+    def payment_result(self):
+        """One row per (pickup_zone, revenue_month, payment_type)."""
+        result = self._by_zone(self.payments, ["payment_type"])
+        result["trips"] = result["trips"].round().astype(np.int64)
+        result.insert(2, "service_type", self.service_type)
+        result.insert(3, "source", self.source)
+        result["revenue_month"] = result["revenue_month"].astype("datetime64[s]").dt.date
+        return result
+
+    def flush(self, engine, table):
+        if self.state is None:
+            print(f"No rows aggregated for {self.source}")
+            return
+
+        result = self.result()
+        payments = self.payment_result() if self.payments is not None else None
+        loads = pd.DataFrame({"source": [self.source], "loaded_at": [pd.Timestamp.now(tz="UTC")]})
+        with engine.begin() as conn:
+            for name, rows in ((table, result), (f"{table}_payment_mix", payments), (f"{table}_loads", loads)):
+                if inspect(conn).has_table(name):
+                    conn.execute(text(f"DELETE FROM {name} WHERE source = :source"),
+                                 {"source": self.source})
+                if rows is not None:
+                    rows.to_sql(name=name, con=conn, if_exists='append', index=False)
+            create_monthly_view(conn, table)
+            if inspect(conn).has_table(f"{table}_payment_mix"):
+                create_payment_mix_view(conn, table)
+
+        print(f"Upserted {len(result)} aggregate rows for {self.source} into {table}")
+
+
+def create_monthly_view(conn, table):
+    """(Re)create `<table>_monthly`, merging per-source partial states."""
+    sums = ",\n    ".join(f"SUM({name}) AS {name}" for name in SUM_COLUMNS.values())
+    means = ",\n    ".join(
+        f"SUM({col}_sum) / NULLIF(SUM({col}_count), 0) AS {name}"
+        for col, name in MEAN_COLUMNS.items()
+    )
+    conn.execute(text(f"DROP VIEW IF EXISTS {table}_monthly"))
+    conn.execute(text(f"""
+CREATE VIEW {table}_monthly AS
+SELECT
+    pickup_zone,
+    revenue_month,
+    service_type,
+    {sums},
+    SUM(total_monthly_trips) AS total_monthly_trips,
+    {means}
+FROM {table}
+GROUP BY pickup_zone, revenue_month, service_type
+"""))
+
+
+def create_payment_mix_view(conn, table):
+    """(Re)create `<table>_payment_mix_monthly`, merging per-source payment counts."""
+    conn.execute(text(f"DROP VIEW IF EXISTS {table}_payment_mix_monthly"))
+    conn.execute(text(f"""
+CREATE VIEW {table}_payment_mix_monthly AS
+SELECT
+    pickup_zone,
+    revenue_month,
+    service_type,
+    payment_type,
+    SUM(trips) AS trips,
+    SUM(total_amount) AS total_amount
+FROM {table}_payment_mix
+GROUP BY pickup_zone, revenue_month, service_type, payment_type
+"""))
@@ -0,0 +1,405 @@
+"""End-to-end benchmarks for every ingestion path in the repo.
+
+Each path runs in a fresh process against local stand-ins, on synthetic
+inputs from generate_trips.py:
+  - HTTP sources are served by a stub server that counts bytes sent
+  - the Postgres destination is replaced by --db-url (a temp SQLite file
+    by default; pass a scratch Postgres URL to measure real writes)
+  - GCS cases only run when STORAGE_EMULATOR_HOST points at a fake GCS
+    server (e.g. fake-gcs-server) and google-cloud-storage is installed
+
+Rows/sec, wall time, peak RSS and bytes transferred are written to a JSON
+results file and, when a baseline is given, compared against it; the exit
+code is non-zero if any case regressed beyond the tolerance.
+
+Usage example:
+  python benchmarks/bench.py --rows 500000 --baseline benchmarks/baseline.json
+"""
+import gzip
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from queue import Empty
+from urllib.parse import parse_qs, urlparse
+
+import click
+
+REPO = Path(__file__).resolve().parents[2]
+PIPELINE_DIR = REPO / "pipeline"
+MODULE_3_DIR = REPO / "module-3-data-warehousing"
+MODULE_4_DIR = REPO / "module-4-analytics-engineering"
+MODULE_5_DIR = REPO / "module-5-data-platforms" / "my-pipeline" / "pipeline" / "assets" / "ingestion"
+DLT_DIR = REPO / "workhops-ingestion-with-dlt"
+
+sys.path.insert(0, str(PIPELINE_DIR))
+
+DLT_PAGE_SIZE = 1000
+
+
+class Skip(Exception):
+    pass
+
+
+class StubHandler(SimpleHTTPRequestHandler):
+    """Serves files from the work dir plus the paginated JSON API used by dlt."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path != "/api":
+            return super().do_GET()
+
+        page = int(parse_qs(parsed.query).get("page", ["1"])[0])
+        records = self.server.api_records[(page - 1) * DLT_PAGE_SIZE:page * DLT_PAGE_SIZE]
+        body = json.dumps(records).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(len(body))
+
+    def copyfile(self, source, outputfile):
+        before = source.tell()
+        super().copyfile(source, outputfile)
+        self.server.count(source.tell() - before)
+
+
+class StubServer(ThreadingHTTPServer):
+
+    def __init__(self, root, api_records):
+        super().__init__(("127.0.0.1", 0), lambda *args: StubHandler(*args, directory=str(root)))
+        self.api_records = api_records
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+    def count(self, n):
+        with self._lock:
+            self.bytes_sent += n
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+def prepare_inputs(workdir, rows):
+    from generate_trips import generate, write
+
+    write(generate("yellow", rows, year=2021, month=1), str(workdir / "yellow_tripdata_2021-01.csv.gz"), "yellow")
+    write(generate("green", rows, year=2025, month=11), str(workdir / "green_tripdata_2025-11.parquet"), "green")
+    write(generate("yellow", rows, year=2024, month=1), str(workdir / "yellow_tripdata_2024-01.parquet"), "yellow")
+    shutil.copy(PIPELINE_DIR / "taxi_zone_lookup.csv", workdir / "taxi_zone_lookup.csv")
+
+    api_rows = min(rows, 100_000)
+    api_records = next(generate("yellow", api_rows, batch_size=api_rows)).astype(str).to_dict("records")
+    return api_records
+
+
+def peak_rss_mb():
+    """High-water RSS of this process (VmHWM resets on exec, ru_maxrss does not)."""
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def stand_in_engine(ctx):
+    from sqlalchemy import create_engine
+
+    return lambda *args: create_engine(ctx["db_url"])
+
+
+def count_rows(ctx, table):
+    from sqlalchemy import create_engine, text
+
+    with create_engine(ctx["db_url"]).connect() as conn:
+        return conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+
+
+def bench_pipeline_ingest_data(ctx):
+    import pipeline
+
+    pipeline.postgres_engine = stand_in_engine(ctx)
+    pipeline.ingest_data.main([
+        "--url", f"{ctx['url']}/yellow_tripdata_2021-01.csv.gz",
+        "--table", "bench_yellow",
+    ], standalone_mode=False)
+    return count_rows(ctx, "bench_yellow")
+
+
+def bench_ingest_green(ctx):
+    import ingest_green
+
+    ingest_green.postgres_engine = stand_in_engine(ctx)
+    ingest_green.ingest_green.main([
+        "--url", f"{ctx['url']}/green_tripdata_2025-11.parquet",
+        "--table", "bench_green",
+    ], standalone_mode=False)
+    return count_rows(ctx, "bench_green")
+
+
+def bench_ingest_zones(ctx):
+    import ingest_zones
+
+    ingest_zones.postgres_engine = stand_in_engine(ctx)
+    ingest_zones.ingest_zones.main([
+        "--url", f"{ctx['url']}/taxi_zone_lookup.csv",
+        "--table", "bench_zones",
+    ], standalone_mode=False)
+    return count_rows(ctx, "bench_zones")
+
+
+def bench_trips_materialize(ctx):
+    sys.path.insert(0, str(MODULE_5_DIR))
+    import trips
+
+    trips.BASE_URL = f"{ctx['url']}/"
+    os.environ.update({
+        "BRUIN_START_DATE": "2024-01-01",
+        "BRUIN_END_DATE": "2024-01-31",
+        "BRUIN_VARS": json.dumps({"taxi_types": ["yellow"]}),
+    })
+    return len(trips.materialize())
+
+
+def bench_dlt_trips(ctx):
+    sys.path.insert(0, str(DLT_DIR))
+    try:
+        import taxi_pipeline
+    except ImportError as e:
+        raise Skip(f"dlt not installed ({e})")
+
+    return len(list(taxi_pipeline.trips(base_url=f"{ctx['url']}/api")))
+
+
+def bench_module_3_download(ctx):
+    sys.path.insert(0, str(MODULE_3_DIR))
+    try:
+        import load_taxi_data
+    except Exception as e:
+        raise Skip(f"google-cloud-storage unavailable ({e})")
+    import pyarrow.parquet as pq
+
+    load_taxi_data.BASE_URL = f"{ctx['url']}/yellow_tripdata_2024-"
+    load_taxi_data.DOWNLOAD_DIR = ctx["workdir"]
+    path = load_taxi_data.download_file("01")
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def bench_module_4_download(ctx):
+    if shutil.which("wget") is None:
+        raise Skip("wget not installed")
+    sys.path.insert(0, str(MODULE_4_DIR))
+    import download_nyc_taxi
+
+    dest = Path(ctx["workdir"]) / "download" / "yellow_tripdata_2021-01.csv.gz"
+    if not download_nyc_taxi.download_file(f"{ctx['url']}/yellow_tripdata_2021-01.csv.gz", dest):
+        raise RuntimeError("download failed")
+    with gzip.open(dest, "rb") as fh:
+        return sum(1 for _ in fh) - 1
+
+
+def gcs_client():
+    if not os.getenv("STORAGE_EMULATOR_HOST"):
+        raise Skip("STORAGE_EMULATOR_HOST not set")
+    try:
+        from google.cloud import storage
+    except ImportError as e:
+        raise Skip(f"google-cloud-storage unavailable ({e})")
+    return storage.Client()
+
+
+def bench_module_3_upload(ctx):
+    gcs_client()
+    sys.path.insert(0, str(MODULE_3_DIR))
+    import load_taxi_data
+    import pyarrow.parquet as pq
+
+    path = os.path.join(ctx["workdir"], "yellow_tripdata_2024-01.parquet")
+    load_taxi_data.upload_to_gcs([path])
+    ctx["bytes_override"] = os.path.getsize(path)
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def bench_module_4_upload(ctx):
+    client = gcs_client()
+    sys.path.insert(0, str(MODULE_4_DIR))
+    import upload_and_load_gcs_bq
+
+    src = Path(ctx["workdir"]) / "yellow_tripdata_2021-01.csv.gz"
+    upload_and_load_gcs_bq.create_bucket_if_not_exists(client, "bench-bucket", "bench")
+    # A fresh prefix each run, so the sync always uploads instead of finding the file unchanged
+    status = upload_and_load_gcs_bq.sync_files(client, "bench-bucket", {f"bench/{time.time_ns()}/{src.name}": src})
+    if "failed" in status.values():
+        raise RuntimeError(f"Upload of {src} failed")
+    ctx["bytes_override"] = src.stat().st_size
+    with gzip.open(src, "rb") as fh:
+        return sum(1 for _ in fh) - 1
+
+
+CASES = {
+    "pipeline.ingest_data": bench_pipeline_ingest_data,
+    "ingest_green": bench_ingest_green,
+    "ingest_zones": bench_ingest_zones,
+    "trips.materialize": bench_trips_materialize,
+    "taxi_pipeline.trips": bench_dlt_trips,
+    "module-3.download_file": bench_module_3_download,
+    "module-3.upload_to_gcs": bench_module_3_upload,
+    "module-4.download_file": bench_module_4_download,
+    "module-4.sync_files": bench_module_4_upload,
+}
+
+
+def _run_case(name, ctx, queue):
+    os.chdir(ctx["workdir"])
+    sys.path.insert(0, str(PIPELINE_DIR))
+    try:
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            start = time.perf_counter()
+            rows = CASES[name](ctx)
+            wall = time.perf_counter() - start
+    except Skip as e:
+        queue.put({"skipped": str(e)})
+        return
+    except Exception as e:
+        queue.put({"error": repr(e)})
+        return
+
+    queue.put({
+        "rows": int(rows),
+        "wall_seconds": round(wall, 4),
+        "rows_per_sec": round(rows / wall, 1) if wall else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "bytes_override": ctx.get("bytes_override"),
+    })
+
+
+def run_case(name, ctx, server, timeout):
+    mp = multiprocessing.get_context("spawn")
+    queue = mp.Queue()
+    before = server.bytes_sent
+    proc = mp.Process(target=_run_case, args=(name, ctx, queue))
+    proc.start()
+    deadline = time.monotonic() + timeout
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=1.0)
+        except Empty:
+            if not proc.is_alive():
+                # One last look, in case the result landed as the worker exited
+                try:
+                    result = queue.get(timeout=1.0)
+                except Empty:
+                    # Crashed or OOM-killed before reporting
+                    result = {"error": f"worker exited with code {proc.exitcode} without a result"}
+            elif time.monotonic() > deadline:
+                proc.kill()
+                result = {"error": f"timed out after {timeout:.0f}s"}
+    proc.join()
+
+    override = result.pop("bytes_override", None)
+    if "rows" in result:
+        result["bytes_transferred"] = override or server.bytes_sent - before
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of human readable regressions against the baseline."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or "rows" not in current or "rows" not in previous:
+            continue
+        if current["rows_per_sec"] < previous["rows_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: rows/sec {previous['rows_per_sec']:,.0f} -> {current['rows_per_sec']:,.0f}")
+        if current["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: peak RSS {previous['peak_rss_mb']:.0f} MB -> {current['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+@click.command()
+@click.option('--rows', default=200_000, type=int, help='Rows per synthetic input file')
+@click.option('--db-url', default=None, help='Destination stand-in (default: temp SQLite file)')
+@click.option('--only', multiple=True, type=click.Choice(list(CASES)), help='Run only these cases')
+@click.option('--output', default=str(Path(__file__).with_name('results.json')))
+@click.option('--baseline', default=None, help='Baseline results JSON to compare against')
+@click.option('--save-baseline', is_flag=True, help='Also write the results to --baseline')
+@click.option('--tolerance', default=0.15, type=float, help='Allowed relative slowdown / RSS growth')
+@click.option('--case-timeout', default=1800.0, help='Seconds before a case is killed and recorded as failed')
+def bench(rows, db_url, only, output, baseline, save_baseline, tolerance, case_timeout):
+    workdir = Path(tempfile.mkdtemp(prefix="taxi-bench-"))
+    print(f"Generating {rows:,} row inputs in {workdir}...")
+    # Generated in a worker so the pandas working set never inflates this process
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        api_records = pool.apply(prepare_inputs, (workdir, rows))
+
+    server = StubServer(workdir, api_records)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    ctx = {
+        "url": server.url,
+        "workdir": str(workdir),
+        "db_url": db_url or f"sqlite:///{workdir / 'bench.db'}",
+    }
+
+    results = {}
+    try:
+        for name in only or CASES:
+            print(f"Running {name}...")
+            results[name] = result = run_case(name, ctx, server, case_timeout)
+            if "rows" in result:
+                print(f"  {result['rows']:,} rows in {result['wall_seconds']:.2f}s "
+                      f"({result['rows_per_sec']:,.0f} rows/s, {result['peak_rss_mb']:.0f} MB peak RSS, "
+                      f"{result['bytes_transferred']:,} bytes)")
+            else:
+                print(f"  {result}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "rows": rows,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    Path(output).write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+    if baseline and save_baseline:
+        Path(baseline).write_text(json.dumps(report, indent=2))
+        print(f"Baseline saved to {baseline}")
+    elif baseline and Path(baseline).exists():
+        regressions = compare(results, json.loads(Path(baseline).read_text()), tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,147 @@
+"""Load test for the aggregate read API (serve.py).
+
+Discovers the zones and months being served, then has --concurrency
+threads replay a fixed, seeded mix of /revenue, /trips and /payment-mix
+requests over keep-alive connections for --duration seconds. With --etag,
+clients revalidate with If-None-Match like a browser or CDN would, so
+repeat requests come back as 304s.
+
+Reports requests/sec, p50/p90/p99/max latency and status counts, and
+optionally writes them to a JSON file.
+
+Usage example:
+  python main.py serve --table zone_revenue &
+  python benchmarks/loadtest.py --url http://127.0.0.1:8080 --concurrency 8 --duration 10
+"""
+import http.client
+import json
+import random
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode, urlparse
+
+import click
+
+
+def fetch_json(base, path):
+    parsed = urlparse(base)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise click.ClickException(f"GET {path} returned {response.status}: {body[:200]!r}")
+        return json.loads(body)
+    finally:
+        conn.close()
+
+
+def request_mix(base, n, seed):
+    """`n` request paths drawn from the zones and months the API serves."""
+    rows = fetch_json(base, "/revenue")
+    if not rows:
+        raise click.ClickException("The API serves no revenue rows; ingest with --aggregate-table first")
+    zones = sorted({row["pickup_zone"] for row in rows})
+    months = sorted({row["revenue_month"][:7] for row in rows})
+
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(n):
+        endpoint = rng.choice(["/revenue", "/trips", "/payment-mix"])
+        params = {}
+        if rng.random() < 0.8:
+            params["zone"] = rng.choice(zones)
+        if rng.random() < 0.8:
+            params["month"] = rng.choice(months)
+        if endpoint == "/trips" and rng.random() < 0.3:
+            params["by"] = "month"
+        paths.append(endpoint + ("?" + urlencode(params) if params else ""))
+    return paths
+
+
+def worker(base, paths, deadline, use_etag, latencies, statuses, lock):
+    parsed = urlparse(base)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+    etags = {}
+    local_latencies, local_statuses = [], Counter()
+    i = 0
+    try:
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            headers = {"If-None-Match": etags[path]} if use_etag and path in etags else {}
+            start = time.perf_counter()
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                local_statuses["error"] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+                continue
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses[response.status] += 1
+            if response.getheader("ETag"):
+                etags[path] = response.getheader("ETag")
+    finally:
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+@click.command()
+@click.option('--url', default='http://127.0.0.1:8080', help='Base URL of the running API')
+@click.option('--concurrency', default=8, help='Client threads, each with its own keep-alive connection')
+@click.option('--duration', default=10.0, help='Seconds to run')
+@click.option('--distinct', default=500, help='Distinct request paths in the mix')
+@click.option('--etag', is_flag=True, help='Revalidate with If-None-Match')
+@click.option('--seed', default=0, help='Seed for the request mix')
+@click.option('--results', default=None, help='Also write the summary to this JSON file')
+def loadtest(url, concurrency, duration, distinct, etag, seed, results):
+    paths = request_mix(url, distinct, seed)
+    print(f"{len(set(paths))} distinct requests, {concurrency} clients, {duration:.0f}s"
+          + (", revalidating with ETags" if etag else ""))
+
+    latencies, statuses, lock = [], Counter(), threading.Lock()
+    started = time.perf_counter()
+    deadline = started + duration
+    # Each client starts at a different point of the mix
+    offsets = [i * len(paths) // concurrency for i in range(concurrency)]
+    threads = [
+        threading.Thread(target=worker, args=(url, paths[o:] + paths[:o], deadline, etag, latencies, statuses, lock))
+        for o in offsets
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    summary = {
+        "requests": len(latencies),
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        "p90_ms": round(percentile(latencies, 0.90) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else None,
+        "statuses": {str(status): n for status, n in sorted(statuses.items(), key=str)},
+    }
+    print(json.dumps(summary, indent=2))
+    if results:
+        with open(results, "w") as fh:
+            json.dump(summary, fh, indent=2)
+
+
+if __name__ == "__main__":
+    loadtest()
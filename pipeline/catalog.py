@@ -0,0 +1,316 @@
+"""Local metadata catalog of Parquet source files.
+
+For each source file the catalog stores its size and checksum (the HTTP
+ETag, or an MD5 for local files), row count, schema fingerprint, min/max
+pickup timestamps and per-row-group statistics. Remote files are
+harvested with HTTP range requests, so only the footer is downloaded, not
+the data. Loaders consult the catalog to skip files already loaded the
+same way (same checksum and read profile: window, columns, sampling,
+validation), to project only the columns that exist and to plan
+row-group-level reads for a pickup window.
+
+The module fetchers are standalone script directories and don't import
+this package, so each carries the part of this that fits it: module 5's
+trips.materialize plans row-group range reads from the footer, and
+module 3's load_taxi_data and module 4's download_nyc_taxi skip files
+whose source checksum is unchanged since they were downloaded.
+
+Usage example:
+  python catalog.py harvest https://d37ci6vzurychx.cloudfront.net/trip-data/green_tripdata_2025-11.parquet
+  python catalog.py show
+"""
+import hashlib
+import io
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+import click
+
+from sources import is_local, local_path
+
+DEFAULT_CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog.sqlite")
+
+PICKUP_COLUMNS = ("tpep_pickup_datetime", "lpep_pickup_datetime", "pickup_datetime")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    url TEXT PRIMARY KEY,
+    size INTEGER,
+    checksum TEXT,
+    num_rows INTEGER,
+    num_row_groups INTEGER,
+    schema_fingerprint TEXT,
+    columns TEXT,
+    pickup_column TEXT,
+    min_pickup TEXT,
+    max_pickup TEXT,
+    harvested_at TEXT
+);
+CREATE TABLE IF NOT EXISTS row_groups (
+    url TEXT,
+    row_group INTEGER,
+    num_rows INTEGER,
+    total_byte_size INTEGER,
+    min_pickup TEXT,
+    max_pickup TEXT,
+    PRIMARY KEY (url, row_group)
+);
+CREATE TABLE IF NOT EXISTS loads (
+    url TEXT,
+    target TEXT,
+    checksum TEXT,
+    loaded_at TEXT,
+    profile TEXT,
+    PRIMARY KEY (url, target)
+);
+"""
+
+
+class HTTPRangeFile(io.RawIOBase):
+    """Seekable read-only view of a remote file backed by HTTP range requests.
+
+    pyarrow only touches the footer when reading metadata, so wrapping a URL
+    in this costs two or three small requests instead of a full download.
+    """
+
+    def __init__(self, url, size=None, headers=None):
+        import urllib.request
+
+        self.url = url
+        self.pos = 0
+        self.requests = 0
+        self.bytes_fetched = 0
+        if size is None:
+            request = urllib.request.Request(url, method="HEAD")
+            with urllib.request.urlopen(request) as response:
+                size = int(response.headers["Content-Length"])
+                headers = dict(response.headers)
+        self.size = size
+        self.headers = headers or {}
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        else:
+            self.pos = self.size + offset
+        return self.pos
+
+    def read(self, size=-1):
+        import urllib.request
+
+        end = self.size if size is None or size < 0 else min(self.size, self.pos + size)
+        if self.pos >= end:
+            return b""
+        request = urllib.request.Request(self.url, headers={"Range": f"bytes={self.pos}-{end - 1}"})
+        with urllib.request.urlopen(request) as response:
+            data = response.read()
+            if response.status != 206:
+                # Server ignored the Range header and sent the whole file
+                data = data[self.pos:end]
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        self.pos += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def file_md5(path, block_size=8 * 1024 * 1024):
+    digest = hashlib.md5()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def remote_checksum(headers):
+    """Cheapest change marker the server gives us: ETag, else size + Last-Modified."""
+    etag = headers.get("ETag") or headers.get("Etag")
+    if etag:
+        return etag.strip('"')
+    return f"{headers.get('Content-Length')}:{headers.get('Last-Modified')}"
+
+
+def current_checksum(url):
+    """Checksum of a source as it is now, without reading remote data."""
+    if is_local(url):
+        return file_md5(local_path(url))
+    import urllib.request
+
+    with urllib.request.urlopen(urllib.request.Request(url, method="HEAD")) as response:
+        return remote_checksum(response.headers)
+
+
+def _stat_value(value):
+    if value is None:
+        return None
+    return value.isoformat(sep=" ") if isinstance(value, datetime) else str(value)
+
+
+def _as_datetime(value):
+    """Naive datetime for an ISO string or datetime, or None if it isn't one."""
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    return value.replace(tzinfo=None)
+
+
+def load_profile(**options):
+    """Canonical form of the options that decide what a load writes."""
+    return json.dumps(options, sort_keys=True, default=str)
+
+
+def harvest_metadata(url):
+    """Read a Parquet footer and summarise it as catalog rows."""
+    import pyarrow.parquet as pq
+
+    if is_local(url):
+        path = local_path(url)
+        size = os.path.getsize(path)
+        checksum = file_md5(path)
+        metadata = pq.ParquetFile(path).metadata
+    else:
+        source = HTTPRangeFile(url)
+        size = source.size
+        checksum = remote_checksum(source.headers)
+        metadata = pq.ParquetFile(source).metadata
+
+    schema = metadata.schema.to_arrow_schema()
+    columns = schema.names
+    fingerprint = hashlib.sha1(
+        "|".join(f"{f.name}:{f.type}" for f in schema).encode()
+    ).hexdigest()
+    pickup_column = next((c for c in PICKUP_COLUMNS if c in columns), None)
+
+    row_groups = []
+    for i in range(metadata.num_row_groups):
+        group = metadata.row_group(i)
+        min_pickup = max_pickup = None
+        if pickup_column is not None:
+            column = group.column(columns.index(pickup_column))
+            if column.is_stats_set and column.statistics.has_min_max:
+                min_pickup = _stat_value(column.statistics.min)
+                max_pickup = _stat_value(column.statistics.max)
+        row_groups.append((url, i, group.num_rows, group.total_byte_size, min_pickup, max_pickup))
+
+    mins = [g[4] for g in row_groups if g[4] is not None]
+    maxs = [g[5] for g in row_groups if g[5] is not None]
+    file_row = (
+        url, size, checksum, metadata.num_rows, metadata.num_row_groups, fingerprint,
+        json.dumps(columns), pickup_column, min(mins, default=None), max(maxs, default=None),
+        datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    )
+    return file_row, row_groups
+
+
+class Catalog:
+
+    def __init__(self, path=DEFAULT_CATALOG):
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def harvest(self, url):
+        file_row, row_groups = harvest_metadata(url)
+        with self.conn:
+            self.conn.execute("DELETE FROM row_groups WHERE url = ?", (url,))
+            self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", file_row)
+            self.conn.executemany("INSERT INTO row_groups VALUES (?, ?, ?, ?, ?, ?)", row_groups)
+        return self.get(url)
+
+    def get(self, url):
+        return self.conn.execute("SELECT * FROM files WHERE url = ?", (url,)).fetchone()
+
+    def refresh(self, url):
+        """Return the entry for url, re-harvesting only if the source changed."""
+        entry = self.get(url)
+        if entry is not None and entry["checksum"] == current_checksum(url):
+            return entry
+        return self.harvest(url)
+
+    def columns(self, url, wanted):
+        """Subset of `wanted` columns the file actually has (for column projection)."""
+        entry = self.get(url)
+        if entry is None:
+            return list(wanted)
+        present = set(json.loads(entry["columns"]))
+        return [c for c in wanted if c in present]
+
+    def plan_row_groups(self, url, start=None, end=None):
+        """Row groups that may contain pickups in [start, end), from footer statistics."""
+        rows = self.conn.execute(
+            "SELECT row_group, min_pickup, max_pickup FROM row_groups WHERE url = ? ORDER BY row_group",
+            (url,),
+        ).fetchall()
+        # Compare as datetimes: stats are stored with a space separator, bounds may use 'T'
+        start, end = _as_datetime(start), _as_datetime(end)
+        plan = []
+        for row in rows:
+            min_pickup, max_pickup = _as_datetime(row["min_pickup"]), _as_datetime(row["max_pickup"])
+            if min_pickup is None or max_pickup is None:
+                plan.append(row["row_group"])
+            elif (end is None or min_pickup < end) and (start is None or max_pickup >= start):
+                plan.append(row["row_group"])
+        return plan
+
+    def already_loaded(self, url, target, checksum, profile=None):
+        """True if `url` was last loaded into `target` from the same bytes with the same read profile."""
+        row = self.conn.execute(
+            "SELECT checksum, profile FROM loads WHERE url = ? AND target = ?", (url, target)
+        ).fetchone()
+        return row is not None and row["checksum"] == checksum and row["profile"] == profile
+
+    def mark_loaded(self, url, target, checksum, profile=None):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO loads (url, target, checksum, loaded_at, profile) VALUES (?, ?, ?, ?, ?)",
+                (url, target, checksum, datetime.now(timezone.utc).isoformat(timespec="seconds"), profile),
+            )
+
+
+@click.group()
+def catalog():
+    """Parquet source metadata catalog."""
+
+
+@catalog.command()
+@click.argument('urls', nargs=-1, required=True)
+@click.option('--path', default=DEFAULT_CATALOG, help='Catalog SQLite file')
+def harvest(urls, path):
+    cat = Catalog(path)
+    for url in urls:
+        entry = cat.refresh(url)
+        print(f"{url}: {entry['num_rows']} rows in {entry['num_row_groups']} row groups, "
+              f"pickups {entry['min_pickup']} .. {entry['max_pickup']}")
+
+
+@catalog.command()
+@click.option('--path', default=DEFAULT_CATALOG, help='Catalog SQLite file')
+def show(path):
+    cat = Catalog(path)
+    for row in cat.conn.execute("SELECT * FROM files ORDER BY url"):
+        print(json.dumps({k: row[k] for k in row.keys() if k != "columns"}))
+
+
+if __name__ == "__main__":
+    catalog()
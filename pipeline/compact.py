@@ -0,0 +1,341 @@
+"""Compact and re-cluster an accumulated Parquet trip dataset.
+
+Repeated exports and appends leave partitions full of small or unsorted
+files. For each directory holding Parquet files (a `pickup_date=...`
+partition, or the dataset root for a flat dataset) this bin-packs the small
+and unsorted files into files of about --target-mb, sorts each bin by pickup
+time and pickup zone, and rewrites it with row-group statistics, sorting
+metadata and bloom filters on the location IDs. Files that are already large
+enough and sorted are kept as they are.
+
+Files are swapped inside the partition directory; subdirectories (nested
+partitions) are never touched. New files are first written under hidden
+names that dataset readers skip, then a hidden journal records which files
+replace which, and only then are the new files renamed into place and the
+replaced ones unlinked. The window in which a reader can list both sets is
+a handful of renames and unlinks. If a run dies inside it, the next run
+finds the journal and either finishes the swap or rolls it back, so rows
+are never left duplicated or lost.
+
+File count, bytes and the runtime of a sample query (one hour, one pickup
+zone) are reported before and after.
+
+Usage example:
+  python compact.py export/yellow --target-mb 256
+  python compact.py export/yellow --dry-run
+"""
+import inspect
+import json
+import os
+import time
+import uuid
+
+import click
+
+from export import PICKUP_COLUMNS, ZONE_COLUMNS
+from metrics import Metrics, metrics_options, profiled
+
+LOCATION_COLUMNS = ("PULocationID", "DOLocationID", "PUlocationID", "DOlocationID")
+# Location IDs are taxi zones, so a few hundred distinct values per row group
+BLOOM_NDV = 512
+BLOOM_FPP = 0.01
+
+
+def parquet_files(directory):
+    return sorted(
+        entry.path for entry in os.scandir(directory)
+        if entry.is_file() and entry.name.endswith('.parquet') and not entry.name.startswith(('.', '_'))
+    )
+
+
+def find_partitions(root):
+    """Directories under `root` that hold Parquet files, skipping hidden and _-prefixed ones."""
+    partitions = []
+    for dirpath, dirnames, _ in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(('.', '_')))
+        if parquet_files(dirpath):
+            partitions.append(dirpath)
+    return partitions
+
+
+def is_sorted(path, pickup_col):
+    """True if the file declares a pickup sort order or its pickup column is non-decreasing."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    metadata = parquet.metadata
+    if metadata.num_rows < 2:
+        return True
+    if metadata.num_row_groups:
+        sorting = metadata.row_group(0).sorting_columns or ()
+        if sorting and metadata.schema.column(sorting[0].column_index).name == pickup_col:
+            return True
+    pickup = parquet.read(columns=[pickup_col]).column(0).combine_chunks()
+    if pa.types.is_timestamp(pickup.type):
+        # min has no kernel for the durations a timestamp diff produces
+        pickup = pickup.cast(pa.int64())
+    smallest_step = pc.min(pc.pairwise_diff(pickup)).as_py()
+    return smallest_step is None or smallest_step >= 0
+
+
+def plan_partition(directory, pickup_col, target_bytes):
+    """Bins of files to rewrite together; each bin is a list of paths of about target_bytes."""
+    import pyarrow.parquet as pq
+
+    # Checking the order can read a file's whole pickup column, so do it once per file
+    sorted_files = {path: is_sorted(path, pickup_col) for path in parquet_files(directory)}
+    candidates = [
+        path for path, in_order in sorted_files.items()
+        if os.path.getsize(path) < target_bytes // 2 or not in_order
+    ]
+    if not candidates:
+        return []
+    if len(candidates) == 1 and sorted_files[candidates[0]]:
+        # A lone small file that is already sorted has nothing to merge with
+        return []
+
+    def first_pickup(path):
+        stats = pq.ParquetFile(path).metadata
+        index = stats.schema.names.index(pickup_col)
+        values = [
+            stats.row_group(i).column(index).statistics.min
+            for i in range(stats.num_row_groups)
+            if stats.row_group(i).column(index).is_stats_set
+        ]
+        return min(values) if values else None
+
+    # Packing files in pickup order keeps each output file's time range narrow
+    first = {path: first_pickup(path) for path in candidates}
+    candidates.sort(key=lambda path: (first[path] is None, first[path] or 0))
+    bins, current, current_bytes = [], [], 0
+    for path in candidates:
+        size = os.path.getsize(path)
+        if current and current_bytes + size > target_bytes:
+            bins.append(current)
+            current, current_bytes = [], 0
+        current.append(path)
+        current_bytes += size
+    if current:
+        bins.append(current)
+    return bins
+
+
+def write_bin(paths, out_path, pickup_col, row_group_size, compression_level):
+    """Merge, sort and write one bin; return (rows, bytes)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.concat_tables([pq.ParquetFile(path).read() for path in paths], promote_options='default')
+    sort_keys = [(pickup_col, 'ascending')]
+    zone_col = next((c for c in ZONE_COLUMNS if c in table.column_names), None)
+    if zone_col:
+        sort_keys.append((zone_col, 'ascending'))
+    table = table.sort_by(sort_keys)
+
+    options = {}
+    if 'bloom_filter_options' in inspect.signature(pq.ParquetWriter.__init__).parameters:
+        options['bloom_filter_options'] = {
+            col: {'ndv': BLOOM_NDV, 'fpp': BLOOM_FPP} for col in LOCATION_COLUMNS if col in table.column_names
+        }
+    tmp_path = f"{out_path}.tmp"
+    with pq.ParquetWriter(
+        tmp_path, table.schema,
+        compression='zstd',
+        compression_level=compression_level,
+        write_statistics=True,
+        sorting_columns=pq.SortingColumn.from_ordering(table.schema, sort_keys),
+        coerce_timestamps='us',
+        allow_truncated_timestamps=True,
+        **options,
+    ) as writer:
+        writer.write_table(table, row_group_size=row_group_size)
+    os.replace(tmp_path, out_path)
+    return table.num_rows, os.path.getsize(out_path)
+
+
+def _finish(directory, journal_path, journal):
+    """Roll a journaled swap forward if all new files are in place, else back."""
+    written = [os.path.join(directory, name) for name in journal['written']]
+    if all(os.path.exists(path) for path in written):
+        doomed = [os.path.join(directory, name) for name in journal['replaced']]
+    else:
+        doomed = written + [os.path.join(directory, name) for name in journal['staged']]
+    for path in doomed:
+        if os.path.exists(path):
+            os.remove(path)
+    os.remove(journal_path)
+
+
+def recover(root):
+    """Complete or undo swaps left half-done by an interrupted run; return how many."""
+    recovered = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(('.', '_'))]
+        for name in sorted(filenames):
+            if name.startswith('.compact-') and name.endswith('.json'):
+                journal_path = os.path.join(dirpath, name)
+                with open(journal_path) as fh:
+                    _finish(dirpath, journal_path, json.load(fh))
+                recovered += 1
+        # Files staged by a run that died before writing its journal replace nothing
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if name.startswith('.part-') and os.path.exists(path):
+                os.remove(path)
+    return recovered
+
+
+def compact_partition(directory, bins, pickup_col, row_group_size, compression_level, metrics):
+    """Rewrite `bins` next to the files they replace and swap them in by name."""
+    token = uuid.uuid4().hex[:8]
+    journal = {
+        'written': [f"part-{token}-{i}.parquet" for i in range(len(bins))],
+        # Hidden while being written, so readers and find_partitions skip them
+        'staged': [f".part-{token}-{i}.parquet.tmp" for i in range(len(bins))],
+        'replaced': [os.path.basename(path) for paths in bins for path in paths],
+    }
+    staged = [os.path.join(directory, name) for name in journal['staged']]
+    try:
+        for paths, out_path in zip(bins, staged):
+            with metrics.stage('write'):
+                rows, size = write_bin(paths, out_path, pickup_col, row_group_size, compression_level)
+            metrics.stages['write']['rows'] += rows
+            metrics.stages['write']['bytes'] += size
+    except BaseException:
+        for path in staged:
+            for leftover in (path, f"{path}.tmp"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        raise
+
+    journal_path = os.path.join(directory, f".compact-{token}.json")
+    with metrics.stage('swap'):
+        with open(f"{journal_path}.tmp", 'w') as fh:
+            json.dump(journal, fh)
+        os.replace(f"{journal_path}.tmp", journal_path)
+        for staged_path, name in zip(staged, journal['written']):
+            os.replace(staged_path, os.path.join(directory, name))
+        _finish(directory, journal_path, journal)
+
+
+def dataset_stats(root):
+    import pyarrow.parquet as pq
+
+    files = [path for partition in find_partitions(root) for path in parquet_files(partition)]
+    return {
+        'files': len(files),
+        'bytes': sum(os.path.getsize(path) for path in files),
+        'row_groups': sum(pq.ParquetFile(path).metadata.num_row_groups for path in files),
+    }
+
+
+def pick_sample(root, pickup_col):
+    """(hour start, zone) from the middle row of the dataset's largest file, for the sample query."""
+    import pyarrow.parquet as pq
+
+    files = [path for partition in find_partitions(root) for path in parquet_files(partition)]
+    if not files:
+        return None
+    largest = max(files, key=os.path.getsize)
+    zone_col = next((c for c in ZONE_COLUMNS if c in pq.ParquetFile(largest).schema_arrow.names), None)
+    table = pq.ParquetFile(largest).read(columns=[pickup_col] + ([zone_col] if zone_col else []))
+    row = table.slice(table.num_rows // 2, 1).to_pylist()[0]
+    if row[pickup_col] is None:
+        return None
+    hour = row[pickup_col].replace(minute=0, second=0, microsecond=0)
+    return hour, zone_col, row.get(zone_col)
+
+
+def time_sample_query(root, pickup_col, sample, repeat=3):
+    """Best-of-`repeat` seconds and row count for one hour of pickups in one zone."""
+    from datetime import timedelta
+
+    import pyarrow.dataset as ds
+
+    hour, zone_col, zone = sample
+    dataset = ds.dataset(root, format='parquet', partitioning='hive')
+    field = ds.field(pickup_col)
+    condition = (field >= hour) & (field < hour + timedelta(hours=1))
+    if zone_col and zone is not None:
+        condition &= ds.field(zone_col) == zone
+    best, rows = None, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = dataset.to_table(columns=[pickup_col], filter=condition).num_rows
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, rows
+
+
+def report(label, stats, query):
+    line = f"{label:<7} {stats['files']:>7,} files {stats['bytes'] / 1024**2:>10,.1f} MB {stats['row_groups']:>7,} row groups"
+    if query is not None:
+        line += f"   sample query {query[0] * 1000:>8.1f} ms ({query[1]:,} rows)"
+    print(line)
+
+
+@click.command()
+@click.argument('path', type=click.Path(exists=True, file_okay=False))
+@click.option('--pickup-col', default=None, help='Pickup timestamp column (detected if omitted)')
+@click.option('--target-mb', default=256, help='Target size of compacted files; a bin is held in memory while it is sorted')
+@click.option('--row-group-size', default=128_000, help='Rows per Parquet row group')
+@click.option('--compression-level', default=6, help='zstd compression level')
+@click.option('--dry-run', is_flag=True, help='Print the plan without rewriting anything')
+@metrics_options
+def compact(path, pickup_col, target_mb, row_group_size, compression_level, dry_run,
+            metrics_json, prom_file, profile):
+    import pyarrow.parquet as pq
+
+    metrics = Metrics('compact')
+
+    with metrics.stage('scan'):
+        recovered = recover(path)
+        if recovered:
+            print(f"Finished {recovered} compactions left over from an interrupted run")
+        partitions = find_partitions(path)
+        if not partitions:
+            raise click.BadParameter(f"No Parquet files under {path}")
+        columns = pq.ParquetFile(parquet_files(partitions[0])[0]).schema_arrow.names
+        pickup_col = pickup_col or next((c for c in PICKUP_COLUMNS if c in columns), None)
+        if pickup_col is None:
+            raise click.BadParameter(f"No pickup column found in {path}; pass --pickup-col")
+        target_bytes = target_mb * 1024**2
+        plans = {partition: plan_partition(partition, pickup_col, target_bytes) for partition in partitions}
+        plans = {partition: bins for partition, bins in plans.items() if bins}
+
+    rewrite = sum(len(paths) for bins in plans.values() for paths in bins)
+    print(f"{len(plans)} of {len(partitions)} partitions need compaction "
+          f"({rewrite} files into {sum(len(bins) for bins in plans.values())})")
+    if 'bloom_filter_options' not in inspect.signature(pq.ParquetWriter.__init__).parameters:
+        print("This pyarrow cannot write bloom filters; compacting without them")
+
+    sample = pick_sample(path, pickup_col)
+    before = dataset_stats(path)
+    before_query = time_sample_query(path, pickup_col, sample) if sample else None
+    report('before', before, before_query)
+    if dry_run or not plans:
+        metrics.emit(metrics_json, prom_file)
+        return
+
+    with profiled(profile, 'compact'):
+        for partition, bins in plans.items():
+            print(f"Compacting {partition}: {sum(len(paths) for paths in bins)} files -> {len(bins)}")
+            compact_partition(partition, bins, pickup_col, row_group_size, compression_level, metrics)
+            metrics.count('partitions')
+            metrics.count('files_rewritten', sum(len(paths) for paths in bins))
+            metrics.count('files_written', len(bins))
+
+    after = dataset_stats(path)
+    after_query = time_sample_query(path, pickup_col, sample) if sample else None
+    report('after', after, after_query)
+    if before_query and after_query and before_query[1] != after_query[1]:
+        raise click.ClickException(
+            f"Sample query returned {after_query[1]} rows after compaction, {before_query[1]} before"
+        )
+    metrics.emit(metrics_json, prom_file)
+
+
+if __name__ == "__main__":
+    compact()
@@ -0,0 +1,49 @@
+"""Postgres connection and bulk-load helpers shared by the pipeline commands."""
+import io
+
+
+def postgres_engine(user, password, host, port, db):
+    # Imported here so `--help` and unrelated subcommands don't pay for SQLAlchemy
+    from sqlalchemy import create_engine
+
+    return create_engine(f'postgresql://{user}:{password}@{host}:{port}/{db}')
+
+
+def create_table_like(engine, table, schema):
+    """(Re)create an empty `table` whose columns match an Arrow schema."""
+    schema.empty_table().to_pandas().to_sql(name=table, con=engine, if_exists='replace', index=False)
+
+
+def copy_arrow(engine, table, data):
+    """Append an Arrow table or record batch to `table`.
+
+    On Postgres the rows go through COPY ... FROM STDIN as CSV written by
+    Arrow, so no pandas DataFrame is built. Other databases fall back to
+    DataFrame.to_sql.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    if engine.dialect.name != 'postgresql':
+        data.to_pandas().to_sql(name=table, con=engine, if_exists='append', index=False)
+        return
+
+    # The CSV writer can't handle dictionary columns (e.g. zone names)
+    columns = [
+        column.cast(column.type.value_type) if pa.types.is_dictionary(column.type) else column
+        for column in data.columns
+    ]
+    data = pa.Table.from_arrays(columns, names=data.schema.names)
+    buffer = io.BytesIO()
+    pacsv.write_csv(data, buffer, pacsv.WriteOptions(include_header=False))
+    buffer.seek(0)
+
+    column_list = ', '.join(f'"{name}"' for name in data.schema.names)
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            # Unquoted empty fields are NULL, quoted ones empty strings
+            cursor.copy_expert(f'COPY "{table}" ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+        conn.commit()
+    finally:
+        conn.close()
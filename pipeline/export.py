@@ -0,0 +1,188 @@
+"""Export a loaded trip table to day-partitioned Parquet.
+
+Rows are streamed out of Postgres with a server-side cursor and spooled to
+Arrow IPC files per pickup day, typed from the table definition rather than
+whatever the first chunk happens to hold. At most --max-open-files spools
+are open at once; a day evicted from that set continues in a new segment
+file. Worker processes then sort each day by pickup time and zone and
+write it as a single zstd Parquet file under `pickup_date=YYYY-MM-DD/`.
+A query for one day then touches one small file, and the sort order
+keeps row-group min/max statistics tight.
+
+Usage example:
+  python export.py --table yellow_taxi_trips --out export/yellow
+"""
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+
+from db import postgres_engine
+from metrics import Metrics, metrics_options, profiled
+
+PICKUP_COLUMNS = ("tpep_pickup_datetime", "lpep_pickup_datetime", "pickup_datetime")
+ZONE_COLUMNS = ("PULocationID", "PUlocationID")
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def arrow_schema(columns):
+    """Arrow schema for SQLAlchemy inspector columns, skipping to_sql's index column."""
+    import pyarrow as pa
+    from sqlalchemy import types
+
+    fields = []
+    for column in columns:
+        if column['name'] == 'index':
+            continue
+        sql_type = column['type']
+        if isinstance(sql_type, types.Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(sql_type, types.Integer):
+            arrow_type = pa.int64()
+        elif isinstance(sql_type, (types.Float, types.Numeric)):
+            arrow_type = pa.float64()
+        elif isinstance(sql_type, types.DateTime):
+            arrow_type = pa.timestamp('us', tz='UTC' if sql_type.timezone else None)
+        elif isinstance(sql_type, types.Date):
+            arrow_type = pa.date32()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column['name'], arrow_type))
+    return pa.schema(fields)
+
+
+def spool_days(chunks, pickup_col, spool_dir, schema, metrics, max_open=128):
+    """Append each chunk's rows to per-day Arrow IPC files; return {day: [paths]}.
+
+    An IPC stream can't be reopened for appending, so when more than
+    `max_open` days are open the least recently written one is closed and
+    its next rows start a new segment.
+    """
+    import pyarrow as pa
+
+    writers = OrderedDict()
+    paths = {}
+    try:
+        for chunk in chunks:
+            chunk = chunk.drop(columns=['index'], errors='ignore')
+            with metrics.stage('spool', rows=len(chunk)):
+                days = chunk[pickup_col].dt.strftime('%Y-%m-%d').fillna(NULL_PARTITION)
+                for day, group in chunk.groupby(days, sort=False):
+                    if day in writers:
+                        writers.move_to_end(day)
+                    else:
+                        if len(writers) >= max_open:
+                            writers.popitem(last=False)[1].close()
+                        segments = paths.setdefault(day, [])
+                        segments.append(os.path.join(spool_dir, f"{day}-{len(segments)}.arrow"))
+                        writers[day] = pa.ipc.new_stream(segments[-1], schema)
+                    writers[day].write_table(pa.Table.from_pandas(group, schema=schema, preserve_index=False))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return paths
+
+
+def write_day(spool_paths, out_dir, day, pickup_col, zone_col, row_group_size, compression_level):
+    """Sort one day's spool segments and write them as pickup_date=<day>/part-0.parquet."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tables = []
+    for spool_path in spool_paths:
+        with pa.memory_map(spool_path) as source:
+            tables.append(pa.ipc.open_stream(source).read_all())
+    table = pa.concat_tables(tables)
+    sort_keys = [(pickup_col, 'ascending')]
+    if zone_col:
+        sort_keys.append((zone_col, 'ascending'))
+    table = table.sort_by(sort_keys)
+
+    partition_dir = os.path.join(out_dir, f"pickup_date={day}")
+    os.makedirs(partition_dir, exist_ok=True)
+    target = os.path.join(partition_dir, "part-0.parquet")
+    tmp_path = f"{target}.tmp"
+    pq.write_table(
+        table, tmp_path,
+        row_group_size=row_group_size,
+        compression='zstd',
+        compression_level=compression_level,
+        write_statistics=True,
+        coerce_timestamps='us',
+        allow_truncated_timestamps=True,
+    )
+    os.replace(tmp_path, target)
+    for spool_path in spool_paths:
+        os.remove(spool_path)
+    return day, table.num_rows, os.path.getsize(target)
+
+
+@click.command()
+@click.option('--user', default='root')
+@click.option('--password', default='root')
+@click.option('--host', default='localhost')
+@click.option('--port', default=5432, type=int)
+@click.option('--db', default='ny_taxi')
+@click.option('--table', default='yellow_taxi_trips')
+@click.option('--out', default='export', help='Output directory for the pickup_date=... partitions')
+@click.option('--pickup-col', default=None, help='Pickup timestamp column (detected if omitted)')
+@click.option('--fetch-size', default=100_000, help='Rows fetched from the server-side cursor at a time')
+@click.option('--row-group-size', default=128_000, help='Rows per Parquet row group')
+@click.option('--compression-level', default=6, help='zstd compression level')
+@click.option('--workers', default=os.cpu_count(), type=int, help='Parallel partition writers')
+@click.option('--max-open-files', default=128, help='Day spool files kept open at once while streaming')
+@metrics_options
+def export_trips(user, password, host, port, db, table, out, pickup_col, fetch_size, row_group_size,
+                 compression_level, workers, max_open_files, metrics_json, prom_file, profile):
+    import pandas as pd
+    import pyarrow as pa
+    from sqlalchemy import inspect, text
+
+    metrics = Metrics('export')
+
+    print("Connecting to Postgres...")
+    engine = postgres_engine(user, password, host, port, db)
+    definition = inspect(engine).get_columns(table)
+    columns = [c['name'] for c in definition]
+    pickup_col = pickup_col or next((c for c in PICKUP_COLUMNS if c in columns), None)
+    if pickup_col is None:
+        raise click.BadParameter(f"No pickup column found in {table}; pass --pickup-col")
+    zone_col = next((c for c in ZONE_COLUMNS if c in columns), None)
+    schema = arrow_schema(definition)
+    timestamps = [field.name for field in schema if pa.types.is_timestamp(field.type)]
+
+    spool_dir = tempfile.mkdtemp(prefix='export-spool-')
+    try:
+        with profiled(profile, 'export'):
+            print(f"Streaming {table}...")
+            with engine.connect().execution_options(stream_results=True) as conn:
+                chunks = pd.read_sql(
+                    text(f'SELECT * FROM "{table}"'), conn,
+                    chunksize=fetch_size, parse_dates=sorted({pickup_col, *timestamps}),
+                )
+                spool = spool_days(chunks, pickup_col, spool_dir, schema, metrics, max_open=max_open_files)
+
+            print(f"Writing {len(spool)} partitions with {workers} workers...")
+            with metrics.stage('write'), ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(write_day, paths, out, day, pickup_col, zone_col,
+                                row_group_size, compression_level)
+                    for day, paths in sorted(spool.items())
+                ]
+                for future in futures:
+                    day, rows, size = future.result()
+                    metrics.stages['write']['rows'] += rows
+                    metrics.stages['write']['bytes'] += size
+                    metrics.count('partitions')
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    print(f"Exported {metrics.stages['write']['rows']} rows of {table} to {out}")
+    metrics.emit(metrics_json, prom_file)
+
+
+if __name__ == "__main__":
+    export_trips()
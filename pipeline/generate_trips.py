@@ -0,0 +1,237 @@
+"""Deterministic synthetic NYC TLC trip data for offline load and scale tests.
+
+Produces yellow/green/fhv-shaped files (the columns the ingest scripts and
+upload_and_load_gcs_bq.py expect) in fixed-size vectorized batches, so
+memory stays constant whatever the row count. Every batch is generated
+from its own (seed, batch number) stream, which makes the output
+reproducible for a given seed.
+
+Usage example:
+  python generate_trips.py --taxi yellow --rows 10000000 --out yellow_tripdata_2021-01.csv.gz
+"""
+import gzip
+
+import click
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from zones import DEFAULT_ZONES_CSV
+
+# Relative pickup volume per hour of day (quiet nights, evening peak)
+HOURLY_PROFILE = np.array([
+    3.0, 2.2, 1.6, 1.1, 0.9, 1.0, 2.0, 3.4, 4.3, 4.5, 4.5, 4.7,
+    5.0, 5.1, 5.4, 5.6, 5.5, 6.0, 6.6, 6.5, 6.0, 5.7, 5.3, 4.2,
+])
+
+FHV_BASES = np.array([f"B{n:05d}" for n in range(2500, 2900, 7)], dtype=object)
+
+NULLABLE = {
+    "yellow": ["VendorID", "passenger_count", "RatecodeID", "store_and_fwd_flag",
+               "payment_type", "congestion_surcharge"],
+    "green": ["VendorID", "passenger_count", "RatecodeID", "store_and_fwd_flag",
+              "payment_type", "trip_type", "congestion_surcharge"],
+    "fhv": ["PUlocationID", "DOlocationID", "SR_Flag", "Affiliated_base_number"],
+}
+
+SCHEMAS = {
+    "yellow": pa.schema([
+        ("VendorID", pa.int64()),
+        ("tpep_pickup_datetime", pa.timestamp("us")),
+        ("tpep_dropoff_datetime", pa.timestamp("us")),
+        ("passenger_count", pa.int64()),
+        ("trip_distance", pa.float64()),
+        ("RatecodeID", pa.int64()),
+        ("store_and_fwd_flag", pa.string()),
+        ("PULocationID", pa.int64()),
+        ("DOLocationID", pa.int64()),
+        ("payment_type", pa.int64()),
+        ("fare_amount", pa.float64()),
+        ("extra", pa.float64()),
+        ("mta_tax", pa.float64()),
+        ("tip_amount", pa.float64()),
+        ("tolls_amount", pa.float64()),
+        ("improvement_surcharge", pa.float64()),
+        ("total_amount", pa.float64()),
+        ("congestion_surcharge", pa.float64()),
+    ]),
+    "green": pa.schema([
+        ("VendorID", pa.int64()),
+        ("lpep_pickup_datetime", pa.timestamp("us")),
+        ("lpep_dropoff_datetime", pa.timestamp("us")),
+        ("store_and_fwd_flag", pa.string()),
+        ("RatecodeID", pa.int64()),
+        ("PULocationID", pa.int64()),
+        ("DOLocationID", pa.int64()),
+        ("passenger_count", pa.int64()),
+        ("trip_distance", pa.float64()),
+        ("fare_amount", pa.float64()),
+        ("extra", pa.float64()),
+        ("mta_tax", pa.float64()),
+        ("tip_amount", pa.float64()),
+        ("tolls_amount", pa.float64()),
+        ("ehail_fee", pa.float64()),
+        ("improvement_surcharge", pa.float64()),
+        ("total_amount", pa.float64()),
+        ("payment_type", pa.int64()),
+        ("trip_type", pa.int64()),
+        ("congestion_surcharge", pa.float64()),
+    ]),
+    "fhv": pa.schema([
+        ("dispatching_base_num", pa.string()),
+        ("pickup_datetime", pa.timestamp("us")),
+        ("dropoff_datetime", pa.timestamp("us")),
+        ("PUlocationID", pa.int64()),
+        ("DOlocationID", pa.int64()),
+        ("SR_Flag", pa.int64()),
+        ("Affiliated_base_number", pa.string()),
+    ]),
+}
+
+
+def zone_weights(seed, zones_csv=DEFAULT_ZONES_CSV):
+    """Zipf-like pickup/dropoff popularity over the real LocationIDs."""
+    location_ids = pd.read_csv(zones_csv)["LocationID"].to_numpy(dtype=np.int64)
+    rng = np.random.default_rng([seed, 0xA11])
+    ranks = rng.permutation(len(location_ids)) + 1
+    weights = 1.0 / ranks ** 0.7
+    return location_ids, weights / weights.sum()
+
+
+def generate_batch(taxi, n, rng, month_start, location_ids, weights,
+                   null_rate=0.01, dup_rate=0.001, bad_rate=0.001):
+    days_in_month = (month_start + pd.offsets.MonthBegin(1) - month_start).days
+    hours = rng.choice(24, size=n, p=HOURLY_PROFILE / HOURLY_PROFILE.sum())
+    offset_s = (
+        rng.integers(0, days_in_month, n) * 86_400
+        + hours * 3_600
+        + rng.integers(0, 3_600, n)
+    )
+    pickup = np.datetime64(month_start, "s") + offset_s.astype("timedelta64[s]")
+    minutes = np.clip(rng.lognormal(2.4, 0.6, n), 1.0, 180.0)
+    dropoff = pickup + (minutes * 60).astype("timedelta64[s]")
+    pu = rng.choice(location_ids, size=n, p=weights)
+    do = rng.choice(location_ids, size=n, p=weights)
+
+    if taxi == "fhv":
+        df = pd.DataFrame({
+            "dispatching_base_num": rng.choice(FHV_BASES, n),
+            "pickup_datetime": pickup,
+            "dropoff_datetime": dropoff,
+            "PUlocationID": pd.array(pu, dtype="Int64"),
+            "DOlocationID": pd.array(do, dtype="Int64"),
+            "SR_Flag": pd.array(np.where(rng.random(n) < 0.05, 1, 0), dtype="Int64"),
+            "Affiliated_base_number": rng.choice(FHV_BASES, n),
+        })
+    else:
+        distance = np.round(np.clip(rng.lognormal(0.7, 0.8, n), 0.0, 60.0), 2)
+        payment_type = rng.choice([1, 2, 3, 4], size=n, p=[0.72, 0.25, 0.02, 0.01])
+        fare = np.round(3.0 + 2.5 * distance + 0.5 * minutes, 2)
+        extra = rng.choice([0.0, 0.5, 1.0, 2.5], size=n)
+        tip = np.where(payment_type == 1, np.round(fare * rng.uniform(0.0, 0.25, n), 2), 0.0)
+        tolls = np.where(rng.random(n) < 0.05, 6.55, 0.0)
+        congestion = np.where(rng.random(n) < 0.7, 2.5, 0.0)
+        total = np.round(fare + extra + 0.5 + tip + tolls + 0.3 + congestion, 2)
+
+        pickup_col, dropoff_col = (
+            ("tpep_pickup_datetime", "tpep_dropoff_datetime") if taxi == "yellow"
+            else ("lpep_pickup_datetime", "lpep_dropoff_datetime")
+        )
+        df = pd.DataFrame({
+            "VendorID": pd.array(rng.choice([1, 2], size=n, p=[0.3, 0.7]), dtype="Int64"),
+            pickup_col: pickup,
+            dropoff_col: dropoff,
+            "passenger_count": pd.array(
+                rng.choice(np.arange(1, 7), size=n, p=[0.7, 0.15, 0.05, 0.03, 0.04, 0.03]),
+                dtype="Int64"),
+            "trip_distance": distance,
+            "RatecodeID": pd.array(rng.choice([1, 2, 5], size=n, p=[0.95, 0.03, 0.02]), dtype="Int64"),
+            "store_and_fwd_flag": pd.array(np.where(rng.random(n) < 0.01, "Y", "N"), dtype="string"),
+            "PULocationID": pd.array(pu, dtype="Int64"),
+            "DOLocationID": pd.array(do, dtype="Int64"),
+            "payment_type": pd.array(payment_type, dtype="Int64"),
+            "fare_amount": fare,
+            "extra": extra,
+            "mta_tax": 0.5,
+            "tip_amount": tip,
+            "tolls_amount": tolls,
+            "improvement_surcharge": 0.3,
+            "total_amount": total,
+            "congestion_surcharge": congestion,
+        })
+        if taxi == "green":
+            df["ehail_fee"] = np.nan
+            df["trip_type"] = pd.array(np.where(rng.random(n) < 0.02, 2, 1), dtype="Int64")
+
+        # A small share of refunds and clock errors, like the real files
+        bad = rng.random(n) < bad_rate
+        for col in ("fare_amount", "total_amount"):
+            df.loc[bad, col] = -df.loc[bad, col]
+        swapped = rng.random(n) < bad_rate
+        df.loc[swapped, dropoff_col] = df.loc[swapped, pickup_col]
+
+    # TLC "unknown" records have their categorical fields blanked together
+    nulls = rng.random(n) < null_rate
+    for col in NULLABLE[taxi]:
+        df.loc[nulls, col] = None
+
+    # Exact duplicates of earlier rows in the same batch
+    rows = np.arange(n)
+    dups = rng.random(n) < dup_rate
+    rows[dups] = rng.integers(0, n, dups.sum())
+    df = df.take(rows).reset_index(drop=True)
+
+    return df[SCHEMAS[taxi].names]
+
+
+def generate(taxi, rows, seed=42, batch_size=1_000_000, year=2021, month=1, **rates):
+    """Yield DataFrames of at most `batch_size` rows until `rows` are produced."""
+    location_ids, weights = zone_weights(seed)
+    month_start = pd.Timestamp(year=year, month=month, day=1)
+    for batch_no, start in enumerate(range(0, rows, batch_size)):
+        rng = np.random.default_rng([seed, batch_no])
+        n = min(batch_size, rows - start)
+        yield generate_batch(taxi, n, rng, month_start, location_ids, weights, **rates)
+
+
+def write(batches, out, taxi):
+    """Stream batches to `out`; the format follows the suffix (.csv.gz or .parquet)."""
+    total = 0
+    if out.endswith(".parquet"):
+        schema = SCHEMAS[taxi]
+        with pq.ParquetWriter(out, schema) as writer:
+            for df in batches:
+                writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+                total += len(df)
+    elif out.endswith(".csv.gz") or out.endswith(".csv"):
+        opener = gzip.open if out.endswith(".gz") else open
+        with opener(out, "wt", newline="") as fh:
+            for i, df in enumerate(batches):
+                df.to_csv(fh, header=(i == 0), index=False)
+                total += len(df)
+    else:
+        raise click.BadParameter(f"Unsupported output format: {out}")
+    return total
+
+
+@click.command()
+@click.option('--taxi', type=click.Choice(['yellow', 'green', 'fhv']), default='yellow')
+@click.option('--rows', default=1_000_000, type=int)
+@click.option('--seed', default=42, type=int)
+@click.option('--batch-size', default=1_000_000, type=int)
+@click.option('--year', default=2021, type=int)
+@click.option('--month', default=1, type=int)
+@click.option('--null-rate', default=0.01, type=float)
+@click.option('--dup-rate', default=0.001, type=float)
+@click.option('--bad-rate', default=0.001, type=float)
+@click.option('--out', required=True, help='Output file (.csv.gz or .parquet)')
+def generate_trips(taxi, rows, seed, batch_size, year, month, null_rate, dup_rate, bad_rate, out):
+    batches = generate(taxi, rows, seed=seed, batch_size=batch_size, year=year, month=month,
+                       null_rate=null_rate, dup_rate=dup_rate, bad_rate=bad_rate)
+    total = write(batches, out, taxi)
+    print(f"Wrote {total} {taxi} rows to {out}")
+
+
+if __name__ == "__main__":
+    generate_trips()
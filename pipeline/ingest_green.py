@@ -1,8 +1,11 @@
-import pandas as pd
-from sqlalchemy import create_engine
-from tqdm.auto import tqdm
+import io
+
 import click
 
+from db import copy_arrow, create_table_like, postgres_engine
+from metrics import Metrics, metrics_options, profiled
+from sources import TimedReader, is_local, local_path, open_source, source_name
+
 dtype = {
     "VendorID": "Int64",
     "passenger_count": "Int64",
@@ -27,9 +30,130 @@ parse_dates = [
     "lpep_dropoff_datetime"
 ]
 
+def plan_reads(catalog, entry, url, columns, start, end, metrics):
+    """Columns and row groups the catalog says we need."""
+    wanted = catalog.columns(url, columns.split(',')) if columns else None
+    if wanted is not None and (start or end) and 'lpep_pickup_datetime' not in wanted:
+        # The window is applied to the pickup column, so it has to be read too
+        wanted.append('lpep_pickup_datetime')
+    row_groups = catalog.plan_row_groups(url, start, end)
+    print(f"Reading {len(row_groups)} of {entry['num_row_groups']} row groups"
+          + (f", columns {wanted}" if wanted else ""))
+    metrics.count('row_groups_skipped', entry['num_row_groups'] - len(row_groups))
+    return wanted, row_groups
+
+
+def read_planned(catalog, entry, url, columns, start, end, metrics):
+    """Read only the row groups and columns the catalog says we need."""
+    import pyarrow.parquet as pq
+    from catalog import HTTPRangeFile
+
+    wanted, row_groups = plan_reads(catalog, entry, url, columns, start, end, metrics)
+
+    with metrics.stage('download'):
+        source = HTTPRangeFile(url, size=entry['size'])
+        table = pq.ParquetFile(source, pre_buffer=True).read_row_groups(row_groups, columns=wanted)
+    metrics.stages['download']['bytes'] += source.bytes_fetched
+
+    with metrics.stage('parse'):
+        df = table.to_pandas()
+    # Row groups are coarse; trim to the exact window
+    return trim_window(df, start, end)
+
+
+def trim_window(df, start=None, end=None):
+    """Rows of `df` with pickups in [start, end)."""
+    from datetime import datetime
+
+    if start:
+        df = df[df['lpep_pickup_datetime'] >= datetime.fromisoformat(start)]
+    if end:
+        df = df[df['lpep_pickup_datetime'] < datetime.fromisoformat(end)]
+    return df
+
+
+def local_batches(path, chunksize, row_groups=None, columns=None, start=None, end=None):
+    """Record batches of a memory-mapped local Parquet file, trimmed to [start, end)."""
+    from datetime import datetime
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path, memory_map=True)
+    for batch in parquet.iter_batches(batch_size=chunksize, row_groups=row_groups, columns=columns):
+        if start or end:
+            pickup_type = batch.schema.field('lpep_pickup_datetime').type
+        if start:
+            bound = pa.scalar(datetime.fromisoformat(start), pickup_type)
+            batch = batch.filter(pc.greater_equal(batch.column('lpep_pickup_datetime'), bound))
+        if end:
+            bound = pa.scalar(datetime.fromisoformat(end), pickup_type)
+            batch = batch.filter(pc.less(batch.column('lpep_pickup_datetime'), bound))
+        yield batch
+
+
+def ingest_local(engine, table, path, chunksize, zones, aggregate, metrics,
+                 row_groups=None, columns=None, start=None, end=None, validator=None, sampler=None, sketches=None, od=None):
+    """Stream a local file into `table` batch by batch, staying in Arrow unless
+    enrichment or aggregation needs a DataFrame."""
+    import time
+
+    import pyarrow as pa
+
+    total = 0
+    first = True
+    chunk_start = time.perf_counter()
+    for batch in local_batches(path, chunksize, row_groups, columns, start, end):
+        rows = batch.num_rows
+        metrics.record('parse', time.perf_counter() - chunk_start, rows=rows, bytes=batch.nbytes)
+
+        if sampler is not None:
+            with metrics.stage('sample', rows=rows):
+                batch = sampler.sample(batch, metrics)
+            rows = batch.num_rows
+
+        if validator is not None:
+            with metrics.stage('validate', rows=rows):
+                batch, rejected = validator.check(batch, metrics)
+                validator.quarantine(rejected)
+            rows = batch.num_rows
+
+        df = None
+        if zones is not None or aggregate is not None or sketches is not None or od is not None:
+            df = batch.to_pandas()
+            if zones is not None:
+                with metrics.stage('enrich', rows=rows):
+                    df = zones.enrich(df)
+                    batch = pa.Table.from_pandas(df, preserve_index=False)
+
+        with metrics.stage('write', rows=rows):
+            if first:
+                create_table_like(engine, table, batch.schema)
+                first = False
+            copy_arrow(engine, table, batch)
+
+        if aggregate is not None:
+            with metrics.stage('aggregate', rows=rows):
+                aggregate.update(df)
+
+        if sketches is not None:
+            with metrics.stage('sketches', rows=rows):
+                sketches.update(df)
+
+        if od is not None:
+            with metrics.stage('od_matrix', rows=rows):
+                od.update(df)
+
+        total += rows
+        metrics.observe_chunk(time.perf_counter() - chunk_start)
+        chunk_start = time.perf_counter()
+    return total
+
+
 @click.command()
 @click.option('--user', default='root')
-@click.option('--password', default='root')
+@click.option('--password', default='root', envvar='PGPASSWORD', help='Also read from $PGPASSWORD')
 @click.option('--host', default='localhost')
 @click.option('--port', default=5432, type=int)
 @click.option('--db', default='ny_taxi')
@@ -39,16 +163,183 @@ parse_dates = [
     default='https://d37ci6vzurychx.cloudfront.net/trip-data/green_tripdata_2025-11.parquet'
 )
 @click.option('--chunksize', default=100_000)
-def ingest_green(user, password, host, port, db, table, url, chunksize):
+@click.option('--zones-csv', default=None, help='Taxi zone lookup CSV; adds pickup/dropoff borough and zone columns')
+@click.option('--aggregate-table', default=None, help='Also maintain monthly zone revenue aggregates in this table')
+@click.option('--sketch-store', default=None, help='Also build distinct-count and quantile sketches per zone and day here')
+@click.option('--od-store', default=None, help='Also add trips to the origin-destination matrices in this directory')
+@click.option('--catalog', 'catalog_path', default=None,
+              help='Parquet metadata catalog; skips files already loaded the same way into --table')
+@click.option('--columns', default=None, help='Comma-separated columns to load (needs --catalog); with --start/--end the pickup column is added')
+@click.option('--start', default=None,
+              help='Only load pickups on or after this date; with --catalog, earlier row groups are not read')
+@click.option('--end', default=None,
+              help='Only load pickups before this date; with --catalog, later row groups are not read')
+@click.option('--validate', is_flag=True, help='Drop rows failing the data quality rules before loading')
+@click.option('--quarantine', default=None, help='Write rejected rows to this Parquet file (implies --validate)')
+@click.option('--sample', type=click.FloatRange(0, 1, min_open=True), default=None,
+              help='Keep this deterministic fraction of trips, weighting them back up in the aggregates')
+@click.option('--cache-dir', default=None, help='Keep downloaded, parsed data here as Arrow IPC and reuse it on reruns')
+@click.option('--cache-max-gb', default=20.0, help='Evict least recently used cache entries beyond this size')
+@metrics_options
+def ingest_green(user, password, host, port, db, table, url, chunksize, zones_csv, aggregate_table, sketch_store, od_store,
+                 catalog_path, columns, start, end, validate, quarantine, sample, cache_dir, cache_max_gb,
+                 metrics_json, prom_file, profile):
+    import pandas as pd
+    import pyarrow as pa
+    from sqlalchemy import inspect
+    from aggregates import MonthlyZoneRevenue
+    from catalog import Catalog, load_profile
+    from od_matrix import ODMatrix
+    from parse_cache import ParseCache
+    from sample import Sampler
+    from sketches import Sketches
+    from validate import Validator
+    from zones import ZoneLookup
+
+    metrics = Metrics('ingest_green')
 
     print("Connecting to Postgres...")
-    engine = create_engine(f'postgresql://{user}:{password}@{host}:{port}/{db}')
+    engine = postgres_engine(user, password, host, port, db)
+
+    catalog = entry = None
+    # Everything that changes which rows or columns end up in --table
+    read_profile = load_profile(columns=columns, start=start, end=end, sample=sample,
+                                validate=bool(validate or quarantine), zones=bool(zones_csv))
+    if catalog_path:
+        catalog = Catalog(catalog_path)
+        with metrics.stage('catalog'):
+            entry = catalog.refresh(url)
+        if catalog.already_loaded(url, table, entry['checksum'], read_profile) and inspect(engine).has_table(table):
+            print(f"{source_name(url)} unchanged since it was loaded into {table} the same way, skipping")
+            metrics.count('files_skipped')
+            metrics.emit(metrics_json, prom_file)
+            return
+
+    zones = ZoneLookup.from_csv(zones_csv) if zones_csv else None
+    validator = None
+    if validate or quarantine:
+        validator = Validator('lpep_pickup_datetime', 'lpep_dropoff_datetime', quarantine_path=quarantine)
+    sampler = None
+    if sample:
+        print(f"Sampling {sample:.2%} of trips")
+        sampler = Sampler(sample, 'lpep_pickup_datetime', 'lpep_dropoff_datetime')
+
+    sketches = None
+    if sketch_store:
+        sketches = Sketches('lpep_pickup_datetime', 'lpep_dropoff_datetime', source=source_name(url))
+    od = None
+    if od_store:
+        od = ODMatrix('lpep_pickup_datetime', 'lpep_dropoff_datetime', source=source_name(url), zones=zones)
+
+    if is_local(url):
+        aggregate = None
+        if aggregate_table:
+            aggregate = MonthlyZoneRevenue(
+                'Green', 'lpep_pickup_datetime', source=source_name(url), zones=zones
+            )
+        wanted = row_groups = None
+        if entry is not None:
+            wanted, row_groups = plan_reads(catalog, entry, url, columns, start, end, metrics)
+
+        print("Reading memory-mapped Parquet in batches...")
+        with profiled(profile, 'ingest_green'):
+            rows = ingest_local(engine, table, local_path(url), chunksize, zones, aggregate, metrics,
+                                row_groups=row_groups, columns=wanted, start=start, end=end,
+                                validator=validator, sampler=sampler,
+                                sketches=sketches, od=od)
+            if aggregate is not None:
+                with metrics.stage('aggregate_flush'):
+                    aggregate.flush(engine, aggregate_table)
+            if sketches is not None:
+                with metrics.stage('sketches_flush'):
+                    sketches.flush(sketch_store)
+            if od is not None:
+                with metrics.stage('od_matrix_flush'):
+                    od.flush(od_store)
+        if validator is not None:
+            validator.close()
+        print(f"Inserted {rows} rows into {table}")
+
+        if catalog is not None:
+            catalog.mark_loaded(url, table, entry['checksum'], read_profile)
+        metrics.emit(metrics_json, prom_file)
+        return
+
+    # Local files are already read memory-mapped; the cache only saves remote downloads
+    cache = cached = None
+    if cache_dir:
+        cache = ParseCache(cache_dir, int(cache_max_gb * 1024**3))
+        cache_key = cache.key(url, {'columns': columns, 'start': start, 'end': end})
+        cached = cache.table(cache_key)
+
+    with profiled(profile, 'ingest_green'):
+        if cached is not None:
+            print("Reading parsed data from the cache...")
+            metrics.count('cache_hits')
+            with metrics.stage('parse'):
+                df_iter = cached.to_pandas()
+        elif entry is not None:
+            df_iter = read_planned(catalog, entry, url, columns, start, end, metrics)
+        else:
+            print("Reading Parquet in chunks...")
+            with metrics.stage('download'):
+                raw = TimedReader(open_source(url))
+                data = raw.read()
+                raw.close()
+            metrics.stages['download']['bytes'] += raw.bytes
+
+            with metrics.stage('parse'):
+                df_iter = trim_window(pd.read_parquet(io.BytesIO(data), engine='pyarrow'), start, end)
+            del data
+        if cache is not None and cached is None:
+            metrics.count('cache_misses')
+            cache.put_table(cache_key, pa.Table.from_pandas(df_iter, preserve_index=False))
+        rows = len(df_iter)
+        metrics.stages['parse']['rows'] += rows
+
+        if sampler is not None:
+            with metrics.stage('sample', rows=rows):
+                df_iter = sampler.sample(df_iter, metrics)
+            rows = len(df_iter)
+
+        if validator is not None:
+            with metrics.stage('validate', rows=rows):
+                df_iter, rejected = validator.check(df_iter, metrics)
+                validator.quarantine(rejected)
+                validator.close()
+            rows = len(df_iter)
+
+        if zones is not None:
+            with metrics.stage('enrich', rows=rows):
+                df_iter = zones.enrich(df_iter)
+
+        with metrics.stage('write', rows=rows):
+            df_iter.to_sql(name=table, con=engine, if_exists='replace', index=False)
+        print(f"Inserted {rows} rows into {table}")
+
+        if aggregate_table:
+            with metrics.stage('aggregate', rows=rows):
+                aggregate = MonthlyZoneRevenue(
+                    'Green', 'lpep_pickup_datetime', source=source_name(url), zones=zones
+                )
+                aggregate.update(df_iter)
+                aggregate.flush(engine, aggregate_table)
+
+        if sketches is not None:
+            with metrics.stage('sketches', rows=rows):
+                sketches.update(df_iter)
+                sketches.flush(sketch_store)
+
+        if od is not None:
+            with metrics.stage('od_matrix', rows=rows):
+                od.update(df_iter)
+                od.flush(od_store)
 
-    print("Reading Parquet in chunks...")
-    df_iter = pd.read_parquet(url, engine='pyarrow')
+    if catalog is not None:
+        catalog.mark_loaded(url, table, entry['checksum'], read_profile)
 
-    df_iter.to_sql(name=table, con=engine, if_exists='replace', index=False)
-    print(f"Inserted {len(df_iter)} rows into {table}")
+    metrics.observe_chunk(sum(stats['seconds'] for stats in metrics.stages.values()))
+    metrics.emit(metrics_json, prom_file)
 
 if __name__ == "__main__":
     ingest_green()
@@ -1,7 +1,9 @@
-import pandas as pd
-from sqlalchemy import create_engine
+import os
+
 import click
-import urllib.request
+
+from db import postgres_engine
+from metrics import Metrics, metrics_options, profiled
 
 @click.command()
 @click.option('--user', default='root')
@@ -11,23 +13,36 @@ import urllib.request
 @click.option('--db', default='ny_taxi')
 @click.option('--table', default='taxi_zones')
 @click.option('--url', default='https://github.com/DataTalksClub/nyc-tlc-data/releases/download/misc/taxi_zone_lookup.csv')
-def ingest_zones(user, password, host, port, db, table, url):
+@metrics_options
+def ingest_zones(user, password, host, port, db, table, url, metrics_json, prom_file, profile):
+    import urllib.request
+
+    import pandas as pd
+
+    metrics = Metrics('ingest_zones')
 
-    print("Downloading Taxi Zones CSV...")
-    local_file = "/tmp/taxi_zone_lookup.csv"
-    urllib.request.urlretrieve(url, local_file)
+    with profiled(profile, 'ingest_zones'):
+        print("Downloading Taxi Zones CSV...")
+        local_file = "/tmp/taxi_zone_lookup.csv"
+        with metrics.stage('download'):
+            urllib.request.urlretrieve(url, local_file)
+        metrics.stages['download']['bytes'] += os.path.getsize(local_file)
 
-    print("Connecting to Postgres...")
-    engine = create_engine(f'postgresql://{user}:{password}@{host}:{port}/{db}')
+        print("Connecting to Postgres...")
+        engine = postgres_engine(user, password, host, port, db)
 
-    print("Reading CSV...")
-    df = pd.read_csv(local_file)
+        print("Reading CSV...")
+        with metrics.stage('parse'):
+            df = pd.read_csv(local_file)
+        metrics.stages['parse']['rows'] += len(df)
 
-    print(f"Creating table {table} in Postgres...")
-    df.to_sql(name=table, con=engine, if_exists='replace', index=False)
-    print(f"Inserted {len(df)} rows into {table}")
+        print(f"Creating table {table} in Postgres...")
+        with metrics.stage('write', rows=len(df)):
+            df.to_sql(name=table, con=engine, if_exists='replace', index=False)
+        print(f"Inserted {len(df)} rows into {table}")
 
     print("Taxi Zones ingestion finished!")
+    metrics.emit(metrics_json, prom_file)
 
 if __name__ == "__main__":
     ingest_zones()
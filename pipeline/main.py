@@ -1,5 +1,45 @@
+"""Single entry point for the pipeline commands.
+
+The command modules import pandas, SQLAlchemy and friends inside the
+command bodies, so `--help` and short subcommands start without paying
+for them.
+
+Usage example:
+  python main.py trips --url yellow_tripdata_2021-01.csv.gz --table yellow_taxi_trips
+"""
+import click
+
+from catalog import catalog
+from compact import compact
+from export import export_trips
+from ingest_green import ingest_green
+from ingest_zones import ingest_zones
+from od_matrix import od
+from pipeline import ingest_data
+from serve import serve
+from sketches import sketch
+from watch import watch
+
+
+@click.group()
+def cli():
+    """NYC taxi ingestion pipeline."""
+
+
+cli.add_command(ingest_data, name='trips')
+cli.add_command(ingest_green, name='green')
+cli.add_command(ingest_zones, name='zones')
+cli.add_command(catalog, name='catalog')
+cli.add_command(export_trips, name='export')
+cli.add_command(watch, name='watch')
+cli.add_command(od, name='od')
+cli.add_command(sketch, name='sketch')
+cli.add_command(compact, name='compact')
+cli.add_command(serve, name='serve')
+
+
 def main():
-    print("Hello from pipeline!")
+    cli()
 
 
 if __name__ == "__main__":
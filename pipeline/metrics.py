@@ -0,0 +1,170 @@
+"""Lightweight per-stage timing and counters for the ingest commands.
+
+Every command builds one Metrics object, wraps its stages in
+`metrics.stage(...)` and finishes with `metrics.emit(...)`, which prints a
+JSON summary and optionally writes it to a file and to a Prometheus
+textfile (for node_exporter's textfile collector).
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+import click
+
+# Upper bounds (seconds) of the per-chunk latency histogram
+CHUNK_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Metrics:
+
+    def __init__(self, command):
+        self.command = command
+        self.started = time.perf_counter()
+        self.stages = defaultdict(lambda: {"seconds": 0.0, "calls": 0, "rows": 0, "bytes": 0})
+        self.counters = Counter()
+        self.chunk_seconds = []
+
+    @contextmanager
+    def stage(self, name, rows=0, bytes=0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, rows=rows, bytes=bytes)
+
+    def record(self, name, seconds, rows=0, bytes=0, calls=1):
+        stats = self.stages[name]
+        stats["seconds"] += seconds
+        stats["calls"] += calls
+        stats["rows"] += rows
+        stats["bytes"] += bytes
+
+    def record_reads(self, stage, raw, decompressed=None):
+        """Split time spent inside reader.read() calls out of `stage`.
+
+        pandas pulls from the source while it parses, so the time recorded
+        around each chunk includes download and decompression; TimedReader
+        wrappers tell us how much of it that was.
+        """
+        read_seconds = (decompressed or raw).seconds
+        self.stages[stage]["seconds"] -= read_seconds
+        self.stages[stage]["bytes"] += (decompressed or raw).bytes
+        self.record("download", raw.seconds, bytes=raw.bytes, calls=0)
+        if decompressed is not None and decompressed is not raw:
+            self.record("decompress", decompressed.seconds - raw.seconds,
+                        bytes=decompressed.bytes, calls=0)
+
+    def count(self, name, n=1):
+        self.counters[name] += int(n)
+
+    def observe_chunk(self, seconds):
+        self.chunk_seconds.append(seconds)
+
+    def histogram(self):
+        buckets = {str(le): sum(1 for s in self.chunk_seconds if s <= le) for le in CHUNK_BUCKETS}
+        buckets["+Inf"] = len(self.chunk_seconds)
+        return {"buckets": buckets, "sum": sum(self.chunk_seconds), "count": len(self.chunk_seconds)}
+
+    def summary(self):
+        return {
+            "command": self.command,
+            "wall_seconds": round(time.perf_counter() - self.started, 4),
+            "stages": {
+                name: {**stats, "seconds": round(stats["seconds"], 4)}
+                for name, stats in self.stages.items()
+            },
+            "counters": dict(self.counters),
+            "chunk_seconds": self.histogram(),
+        }
+
+    def prometheus(self):
+        labels = f'command="{self.command}"'
+        lines = [
+            "# TYPE taxi_ingest_stage_seconds_total counter",
+            "# TYPE taxi_ingest_stage_rows_total counter",
+            "# TYPE taxi_ingest_stage_bytes_total counter",
+        ]
+        for name, stats in self.stages.items():
+            stage = f'{labels},stage="{name}"'
+            lines.append(f"taxi_ingest_stage_seconds_total{{{stage}}} {stats['seconds']:.6f}")
+            lines.append(f"taxi_ingest_stage_rows_total{{{stage}}} {stats['rows']}")
+            lines.append(f"taxi_ingest_stage_bytes_total{{{stage}}} {stats['bytes']}")
+
+        lines.append("# TYPE taxi_ingest_events_total counter")
+        for name, value in self.counters.items():
+            lines.append(f'taxi_ingest_events_total{{{labels},name="{name}"}} {value}')
+
+        hist = self.histogram()
+        lines.append("# TYPE taxi_ingest_chunk_seconds histogram")
+        for le, n in hist["buckets"].items():
+            lines.append(f'taxi_ingest_chunk_seconds_bucket{{{labels},le="{le}"}} {n}')
+        lines.append(f"taxi_ingest_chunk_seconds_sum{{{labels}}} {hist['sum']:.6f}")
+        lines.append(f"taxi_ingest_chunk_seconds_count{{{labels}}} {hist['count']}")
+
+        lines.append("# TYPE taxi_ingest_last_run_seconds gauge")
+        lines.append(f"taxi_ingest_last_run_seconds{{{labels}}} {time.perf_counter() - self.started:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def emit(self, json_path=None, prom_path=None):
+        summary = json.dumps(self.summary(), indent=2)
+        print(summary)
+        if json_path:
+            with open(json_path, "w") as fh:
+                fh.write(summary)
+        if prom_path:
+            # The textfile collector may read at any time, so swap the file in atomically
+            tmp_path = f"{prom_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as fh:
+                fh.write(self.prometheus())
+            os.replace(tmp_path, prom_path)
+
+
+@contextmanager
+def profiled(enabled, name):
+    """Profile the block with pyinstrument if installed, otherwise cProfile."""
+    if not enabled:
+        yield
+        return
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+
+    if Profiler is not None:
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(f"{name}.profile.html", "w") as fh:
+                fh.write(profiler.output_html())
+            print(profiler.output_text(unicode=True, color=False))
+            print(f"Profile written to {name}.profile.html")
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(f"{name}.prof")
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+        print(out.getvalue())
+        print(f"Profile written to {name}.prof")
+
+
+def metrics_options(f):
+    """Shared --metrics-json / --prom-file / --profile options."""
+    f = click.option('--profile', is_flag=True, help='Profile the ingest loop (pyinstrument or cProfile)')(f)
+    f = click.option('--prom-file', default=None, help='Write metrics to this Prometheus textfile')(f)
+    f = click.option('--metrics-json', default=None, help='Also write the JSON metrics summary to this file')(f)
+    return f
@@ -0,0 +1,292 @@
+"""Precomputed origin-destination matrices keyed by LocationID.
+
+ODMatrix is an ingest sink like MonthlyZoneRevenue. Trip chunks are
+reduced to sparse per-cell sums while they stream through, and flush()
+writes one dense (168 hour-of-week, Z, Z) array per measure and month,
+where Z is sized from the zone lookup. The measures are trip count, fare
+sum and duration sum in seconds. Each source file owns a part under
+`<store>/<month>/parts/<source>/`, so re-ingesting a file only replaces
+its part. The month's total arrays are re-summed from its parts whenever
+one of them changes, together with an all-hours (Z, Z) collapse.
+
+ODStore answers zone-pair questions from the memory-mapped totals. Without
+an hour-of-week filter, top destinations from a zone read one row of the
+all-hours matrix, and borough flows collapse it. With a filter they read
+the matching (hours, Z) or (hours, Z, Z) slice. Either way queries never
+scan trips.
+
+Usage example:
+  python main.py trips --url yellow_tripdata_2021-01.csv.gz --od-store od
+  python od_matrix.py top --store od --zone 132 --month 2021-01
+  python od_matrix.py flows --store od --month 2021-01
+"""
+import json
+import os
+import shutil
+
+import click
+
+HOURS_OF_WEEK = 168
+MEASURES = ("count", "fare", "duration")
+
+
+def hour_of_week(pickup):
+    """Monday 00:00-00:59 is 0, Sunday 23:00-23:59 is 167."""
+    import numpy as np
+
+    hours = pickup.astype("datetime64[h]").astype(np.int64)
+    # 1970-01-01 was a Thursday, i.e. day 3 of a Monday-based week
+    return ((hours // 24 + 3) % 7) * 24 + hours % 24
+
+
+class ODMatrix:
+
+    def __init__(self, pickup_col, dropoff_col, source, zones=None,
+                 pu_col="PULocationID", do_col="DOLocationID"):
+        from zones import ZoneLookup
+
+        self.pickup_col = pickup_col
+        self.dropoff_col = dropoff_col
+        self.pu_col = pu_col
+        self.do_col = do_col
+        self.source = source
+        self.zones = zones or ZoneLookup.from_csv()
+        self.size = self.zones.size
+        self.state = None
+        self.dropped = 0
+
+    def update(self, df):
+        import numpy as np
+        import pandas as pd
+        from sample import WEIGHT_COLUMN
+
+        pickup = df[self.pickup_col].to_numpy(dtype="datetime64[ns]")
+        dropoff = df[self.dropoff_col].to_numpy(dtype="datetime64[ns]")
+        pu = df[self.pu_col].to_numpy(dtype=np.int64, na_value=-1)
+        do = df[self.do_col].to_numpy(dtype=np.int64, na_value=-1)
+        duration = (dropoff - pickup).astype("timedelta64[s]").astype(np.float64)
+
+        keep = (~np.isnat(pickup) & ~np.isnat(dropoff) & (duration >= 0)
+                & (pu >= 0) & (pu < self.size) & (do >= 0) & (do < self.size))
+        self.dropped += int((~keep).sum())
+
+        if WEIGHT_COLUMN in df:
+            weight = df[WEIGHT_COLUMN].to_numpy(dtype=np.float64)[keep]
+        else:
+            weight = np.ones(keep.sum())
+        fare = df["fare_amount"].to_numpy(dtype=np.float64, na_value=0.0)[keep]
+
+        pickup = pickup[keep]
+        part = pd.DataFrame({
+            "month": pickup.astype("datetime64[M]"),
+            "cell": (hour_of_week(pickup) * self.size + pu[keep]) * self.size + do[keep],
+            "count": weight,
+            "fare": fare * weight,
+            "duration": duration[keep] * weight,
+        }).groupby(["month", "cell"]).sum()
+        self.state = part if self.state is None else self.state.add(part, fill_value=0)
+
+    def flush(self, path):
+        import numpy as np
+
+        if self.state is None:
+            print(f"No trips added to the OD matrix for {self.source}")
+            return
+        store = ODStore(path, size=self.size, zones=self.zones)
+        for month, cells in self.state.groupby(level="month"):
+            month = str(np.datetime64(month, "M"))
+            store.write_part(month, self.source, cells.droplevel("month"))
+        print(f"Wrote OD matrices for {self.source} ({self.state.index.get_level_values('month').nunique()} "
+              f"months, {self.dropped} trips without valid zones/times skipped) to {path}")
+
+
+class ODStore:
+
+    def __init__(self, path, size=None, zones=None):
+        self.path = path
+        self._zones = zones
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as fh:
+                self.size = json.load(fh)["size"]
+            if size is not None and size != self.size:
+                raise ValueError(f"{path} holds {self.size}x{self.size} matrices, zone lookup needs {size}")
+        else:
+            if size is None:
+                raise FileNotFoundError(f"No OD matrix store at {path}")
+            os.makedirs(path, exist_ok=True)
+            self.size = size
+            with open(meta_path, "w") as fh:
+                json.dump({"size": size, "hours": HOURS_OF_WEEK, "measures": MEASURES}, fh)
+        self.shape = (HOURS_OF_WEEK, self.size, self.size)
+        self.maps = {}
+
+    def months(self):
+        return sorted(
+            entry.name for entry in os.scandir(self.path)
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, "count.npy"))
+        )
+
+    def write_part(self, month, source, cells):
+        """Densify one source's sparse sums for a month, then rebuild the month total."""
+        import numpy as np
+
+        parts_dir = os.path.join(self.path, month, "parts")
+        final = os.path.join(parts_dir, source)
+        tmp = f"{final}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        cell = cells.index.to_numpy()
+        for measure in MEASURES:
+            # Only the pages holding trips are ever written, so the file stays sparse on disk
+            array = np.lib.format.open_memmap(os.path.join(tmp, f"{measure}.npy"), mode="w+",
+                                              dtype=np.float64, shape=self.shape)
+            array.reshape(-1)[cell] = cells[measure].to_numpy()
+            array.flush()
+            del array
+        if os.path.exists(final):
+            shutil.rmtree(final)
+        os.replace(tmp, final)
+        self.rebuild_month(month)
+
+    def rebuild_month(self, month):
+        import numpy as np
+
+        month_dir = os.path.join(self.path, month)
+        parts_dir = os.path.join(month_dir, "parts")
+        parts = sorted(entry.path for entry in os.scandir(parts_dir) if entry.is_dir() and not entry.name.endswith(".tmp"))
+        for measure in MEASURES:
+            tmp = os.path.join(month_dir, f"{measure}.npy.tmp")
+            total = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float64, shape=self.shape)
+            for part in parts:
+                # One hour-of-week at a time keeps memory to a Z x Z slice
+                values = np.load(os.path.join(part, f"{measure}.npy"), mmap_mode="r")
+                for hour in range(HOURS_OF_WEEK):
+                    total[hour] += values[hour]
+                del values
+            all_hours = np.zeros(self.shape[1:])
+            for hour in range(HOURS_OF_WEEK):
+                all_hours += total[hour]
+            total.flush()
+            del total
+            with open(os.path.join(month_dir, f"{measure}_all_hours.npy.tmp"), "wb") as fh:
+                np.save(fh, all_hours)
+            os.replace(os.path.join(month_dir, f"{measure}_all_hours.npy.tmp"),
+                       os.path.join(month_dir, f"{measure}_all_hours.npy"))
+            os.replace(tmp, os.path.join(month_dir, f"{measure}.npy"))
+
+    @property
+    def zones(self):
+        if self._zones is None:
+            from zones import ZoneLookup
+
+            self._zones = ZoneLookup.from_csv()
+        return self._zones
+
+    def array(self, measure, month, all_hours=False):
+        """Memory-mapped array; maps are reused until the file is replaced by a new load."""
+        import numpy as np
+
+        path = os.path.join(self.path, month, f"{measure}_all_hours.npy" if all_hours else f"{measure}.npy")
+        version = os.stat(path).st_mtime_ns
+        cached = self.maps.get(path)
+        if cached is None or cached[0] != version:
+            cached = self.maps[path] = (version, np.load(path, mmap_mode="r"))
+        return cached[1]
+
+    def select(self, measure, months=None, hours=None, origin=None):
+        """Sum a measure over months and hours-of-week: (Z, Z), or (Z,) for one origin."""
+        import numpy as np
+
+        result = None
+        for month in months or self.months():
+            if hours is None:
+                array = self.array(measure, month, all_hours=True)
+                values = array[origin] if origin is not None else array
+            else:
+                array = self.array(measure, month)
+                values = array[list(hours), origin] if origin is not None else array[list(hours)]
+                values = values.sum(axis=0)
+            result = np.array(values) if result is None else result + values
+        return result
+
+    def top_destinations(self, origin, months=None, hours=None, n=10):
+        import numpy as np
+        import pandas as pd
+
+        count, fare, duration = (self.select(m, months, hours, origin) for m in MEASURES)
+        top = np.argsort(count)[::-1][:n]
+        top = top[count[top] > 0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return pd.DataFrame({
+                "location_id": top,
+                "zone": np.asarray(self.zones.zone(top).astype(object)),
+                "trips": count[top],
+                "avg_fare": fare[top] / count[top],
+                "avg_duration_min": duration[top] / count[top] / 60,
+            })
+
+    def borough_flows(self, months=None, hours=None):
+        """Trips between pickup (rows) and dropoff (columns) boroughs."""
+        import numpy as np
+        import pandas as pd
+
+        matrix = self.select("count", months, hours)
+        boroughs = self.zones.borough(np.arange(self.size))
+        names = list(boroughs.categories)
+        if "Unknown" not in names:
+            names.append("Unknown")
+        # Ids missing from the lookup count as Unknown
+        codes = np.where(boroughs.codes < 0, names.index("Unknown"), boroughs.codes)
+        onehot = np.zeros((self.size, len(names)))
+        onehot[np.arange(self.size), codes] = 1
+        flows = onehot.T @ matrix @ onehot
+        return pd.DataFrame(flows, index=pd.Index(names, name="pickup"), columns=pd.Index(names, name="dropoff"))
+
+
+@click.group()
+def od():
+    """Origin-destination matrix store."""
+
+
+@od.command()
+@click.option('--store', default='od', help='OD matrix store directory')
+@click.option('--zone', 'origin', required=True, type=int, help='Pickup LocationID')
+@click.option('--month', 'months', multiple=True, help='YYYY-MM, repeatable (default: all months)')
+@click.option('--hours', default=None, help='Hour-of-week range, e.g. 7-10 (0 = Monday 00:00)')
+@click.option('-n', default=10, help='Number of destinations')
+def top(store, origin, months, hours, n):
+    import time
+
+    start = time.perf_counter()
+    result = ODStore(store).top_destinations(origin, list(months) or None, _hours(hours), n)
+    elapsed = time.perf_counter() - start
+    print(result.to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+    print(f"({elapsed * 1e6:,.0f} µs)")
+
+
+@od.command()
+@click.option('--store', default='od', help='OD matrix store directory')
+@click.option('--month', 'months', multiple=True, help='YYYY-MM, repeatable (default: all months)')
+@click.option('--hours', default=None, help='Hour-of-week range, e.g. 7-10 (0 = Monday 00:00)')
+def flows(store, months, hours):
+    import time
+
+    import numpy as np
+
+    start = time.perf_counter()
+    result = ODStore(store).borough_flows(list(months) or None, _hours(hours))
+    elapsed = time.perf_counter() - start
+    print(result.round().astype(np.int64).to_string())
+    print(f"({elapsed * 1e6:,.0f} µs)")
+
+
+def _hours(spec):
+    if not spec:
+        return None
+    first, _, last = spec.partition("-")
+    return range(int(first), int(last or first) + 1)
+
+
+if __name__ == "__main__":
+    od()
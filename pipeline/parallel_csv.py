@@ -0,0 +1,163 @@
+"""Parse one large trip CSV on several cores.
+
+A gzip stream can only be read front to back, so the source is first
+decompressed once into a temporary file. That file is cut into byte
+ranges aligned to line starts, and a process pool parses each range with
+the same dtype/parse_dates as the serial loader. Workers hand their typed
+chunk back as an Arrow IPC stream in a shared memory block, so the parent
+maps it instead of unpickling a DataFrame.
+
+TLC trip CSVs have no quoted newlines, which is what makes splitting on
+raw newlines safe.
+"""
+import gzip
+import io
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from sources import TimedReader, is_local, local_path, open_source
+
+RANGE_BYTES = 64 * 1024 * 1024
+
+
+def materialize(url, metrics):
+    """Return (path of a plain local CSV, whether it is a temp file to delete)."""
+    if is_local(url) and not url.endswith('.gz'):
+        return local_path(url), False
+
+    raw = TimedReader(open_source(url))
+    source = TimedReader(gzip.GzipFile(fileobj=raw)) if url.endswith('.gz') else raw
+    with metrics.stage('decompress'):
+        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as tmp:
+            shutil.copyfileobj(source, tmp, 8 * 1024 * 1024)
+    raw.close()
+    metrics.record_reads('decompress', raw, source)
+    return tmp.name, True
+
+
+def split_ranges(path, range_bytes=RANGE_BYTES):
+    """(header, [(start, end), ...]) with every range starting at a line start."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as fh:
+        header = fh.readline()
+        ranges = []
+        start = fh.tell()
+        while start < size:
+            fh.seek(min(start + range_bytes, size))
+            fh.readline()
+            end = min(fh.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+
+def range_bytes_for(path, rows, sample_lines=1000):
+    """Byte range length holding roughly `rows` lines, from the mean length of the first lines."""
+    with open(path, 'rb') as fh:
+        fh.readline()
+        lengths = [len(line) for line, _ in zip(fh, range(sample_lines))]
+    if not lengths:
+        return RANGE_BYTES
+    return max(rows * sum(lengths) // len(lengths), 1)
+
+
+def parse_range(path, header, start, end, dtype, parse_dates):
+    """Parse bytes [start, end) in a worker; return the shared memory block holding the result."""
+    import pandas as pd
+    import pyarrow as pa
+
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+    df = pd.read_csv(io.BytesIO(header + data), dtype=dtype, parse_dates=parse_dates)
+    del data
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    del df
+
+    # Size the stream first so it can be written straight into shared memory
+    mock = pa.MockOutputStream()
+    with pa.ipc.new_stream(mock, table.schema) as writer:
+        writer.write_table(table)
+    size = mock.size()
+
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1), track=False)
+    sink = pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf))
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    sink.close()
+    del sink, writer
+    name = shm.name
+    # The parent unlinks the block once it has read it
+    shm.close()
+    return name, size, table.num_rows
+
+
+def discard(futures):
+    """Cancel futures not yet started and unlink the blocks of the ones that ran."""
+    for future in futures:
+        future.cancel()
+    for future in futures:
+        if future.cancelled():
+            continue
+        try:
+            name = future.result()[0]
+        except Exception:
+            continue
+        try:
+            shared_memory.SharedMemory(name=name, track=False).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def read_shared(name, size):
+    """DataFrame for a worker's result block; the block is unlinked straight away."""
+    import pyarrow as pa
+
+    shm_path = os.path.join("/dev/shm", name)
+    if os.path.exists(shm_path):
+        # Arrow keeps the mapping alive for as long as any column still
+        # points into it, so to_pandas can stay zero-copy
+        with pa.memory_map(shm_path) as source:
+            table = pa.ipc.open_stream(source).read_all()
+        shared_memory.SharedMemory(name=name, track=False).unlink()
+        return table.to_pandas()
+
+    shm = shared_memory.SharedMemory(name=name, track=False)
+    try:
+        data = pa.py_buffer(bytes(shm.buf[:size]))
+    finally:
+        shm.close()
+        shm.unlink()
+    return pa.ipc.open_stream(data).read_all().to_pandas()
+
+
+def read_csv_parallel(url, workers, dtype, parse_dates, metrics, chunksize=None):
+    """Yield DataFrames in file order, parsed by `workers` processes.
+
+    Each range holds about `chunksize` rows (RANGE_BYTES when None). At
+    most 2 * workers ranges are in flight, so shared memory use stays
+    bounded however fast the loader consumes them. Blocks are created
+    untracked, so if the consumer raises or stops early the ones it never
+    read are unlinked here.
+    """
+    path, temporary = materialize(url, metrics)
+    try:
+        range_bytes = range_bytes_for(path, chunksize) if chunksize else RANGE_BYTES
+        header, ranges = split_ranges(path, range_bytes)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = []
+            try:
+                for start, end in ranges:
+                    pending.append(pool.submit(parse_range, path, header, start, end, dtype, parse_dates))
+                    if len(pending) >= 2 * workers:
+                        yield read_shared(*pending.pop(0).result()[:2])
+                while pending:
+                    yield read_shared(*pending.pop(0).result()[:2])
+            finally:
+                discard(pending)
+    finally:
+        if temporary:
+            os.remove(path)
@@ -0,0 +1,124 @@
+"""Cache of parsed, typed source data as Arrow IPC files.
+
+Reruns of an ingest (a failed load, a different target table, a fresh
+database) would otherwise download, decompress and parse the same source
+again. Entries are keyed by the source checksum, the parse profile
+(dtypes, date columns, ...) and PARSER_VERSION. They are read back
+memory-mapped, batch by batch, so a cached rerun is bound by the database
+write. The least recently used entries are evicted once the cache grows
+past its size cap.
+"""
+import hashlib
+import json
+import os
+
+# Bump when a change to the parsing code changes its output
+PARSER_VERSION = 1
+
+
+class ParseCache:
+
+    def __init__(self, cache_dir, max_bytes=20 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, url, profile):
+        from catalog import current_checksum
+
+        text = json.dumps(
+            {"checksum": current_checksum(url), "profile": profile, "parser": PARSER_VERSION},
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.arrow")
+
+    def batches(self, key):
+        """Memory-mapped record batches of a cached entry, or None on a miss."""
+        import pyarrow as pa
+
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)  # LRU order is by mtime
+
+        def read():
+            with pa.memory_map(path) as source:
+                reader = pa.ipc.open_file(source)
+                for i in range(reader.num_record_batches):
+                    yield reader.get_batch(i)
+        return read()
+
+    def frames(self, key):
+        """Cached entry as pandas chunks (dtypes restored from the pandas metadata), or None."""
+        batches = self.batches(key)
+        if batches is None:
+            return None
+        return (batch.to_pandas() for batch in batches)
+
+    def table(self, key):
+        """Whole cached entry as a memory-mapped Arrow table, or None on a miss."""
+        import pyarrow as pa
+
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).read_all()
+
+    def tee(self, key, frames):
+        """Pass DataFrames through while writing them to the cache.
+
+        The entry only becomes visible once the iterator is exhausted, so an
+        interrupted load never leaves a truncated entry behind.
+        """
+        import pyarrow as pa
+
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        writer = schema = None
+        try:
+            for df in frames:
+                # One record batch per chunk, so a cached rerun sees the same chunking
+                table = pa.Table.from_pandas(df, schema=schema, preserve_index=False).combine_chunks()
+                if writer is None:
+                    schema = table.schema
+                    writer = pa.ipc.new_file(tmp_path, schema)
+                writer.write_table(table)
+                yield df
+            if writer is not None:
+                writer.close()
+                writer = None
+                os.replace(tmp_path, path)
+                self.evict()
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put_table(self, key, table):
+        import pyarrow as pa
+
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with pa.ipc.new_file(tmp_path, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".arrow"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
@@ -1,8 +1,12 @@
-import pandas as pd
-from sqlalchemy import create_engine
-from tqdm.auto import tqdm
+import gzip
+import time
+
 import click
 
+from db import postgres_engine
+from metrics import Metrics, metrics_options, profiled
+from sources import TimedReader, open_source, source_name
+
 dtype = {
     "VendorID": "Int64",
     "passenger_count": "Int64",
@@ -29,7 +33,7 @@ parse_dates = [
 
 @click.command()
 @click.option('--user', default='root')
-@click.option('--password', default='root')
+@click.option('--password', default='root', envvar='PGPASSWORD', help='Also read from $PGPASSWORD')
 @click.option('--host', default='localhost')
 @click.option('--port', default=5432, type=int)
 @click.option('--db', default='ny_taxi')
@@ -38,33 +42,150 @@ parse_dates = [
     '--url',
     default='https://github.com/DataTalksClub/nyc-tlc-data/releases/download/yellow/yellow_tripdata_2021-01.csv.gz'
 )
-@click.option('--chunksize', default=100_000)
-def ingest_data(user, password, host, port, db, table, url, chunksize):
+@click.option('--chunksize', default=100_000, help='Rows per chunk; with --parallel, sizes the byte range each process parses')
+@click.option('--zones-csv', default=None, help='Taxi zone lookup CSV; adds pickup/dropoff borough and zone columns')
+@click.option('--aggregate-table', default=None, help='Also maintain monthly zone revenue aggregates in this table')
+@click.option('--sketch-store', default=None, help='Also build distinct-count and quantile sketches per zone and day here')
+@click.option('--od-store', default=None, help='Also add trips to the origin-destination matrices in this directory')
+@click.option('--validate', is_flag=True, help='Drop rows failing the data quality rules before loading')
+@click.option('--quarantine', default=None, help='Write rejected rows to this Parquet file (implies --validate)')
+@click.option('--parallel', default=1, help='Parse with this many processes (decompresses to a temp file first)')
+@click.option('--sample', type=click.FloatRange(0, 1, min_open=True), default=None,
+              help='Keep this deterministic fraction of trips, weighting them back up in the aggregates')
+@click.option('--cache-dir', default=None, help='Keep parsed chunks here as Arrow IPC and reuse them on reruns')
+@click.option('--cache-max-gb', default=20.0, help='Evict least recently used cache entries beyond this size')
+@metrics_options
+def ingest_data(user, password, host, port, db, table, url, chunksize, zones_csv, aggregate_table, sketch_store, od_store,
+                validate, quarantine, parallel, sample, cache_dir, cache_max_gb, metrics_json, prom_file, profile):
+    import pandas as pd
+    from tqdm.auto import tqdm
+    from aggregates import MonthlyZoneRevenue
+    from od_matrix import ODMatrix
+    from parallel_csv import read_csv_parallel
+    from parse_cache import ParseCache
+    from sample import Sampler
+    from sketches import Sketches
+    from validate import Validator
+    from zones import ZoneLookup
+
+    metrics = Metrics('ingest_data')
 
     print("Connecting to Postgres...")
-    engine = create_engine(f'postgresql://{user}:{password}@{host}:{port}/{db}')
+    engine = postgres_engine(user, password, host, port, db)
+
+    raw = source = None
+    cache = cached = None
+    if cache_dir:
+        cache = ParseCache(cache_dir, int(cache_max_gb * 1024**3))
+        cache_key = cache.key(url, {'dtype': dtype, 'parse_dates': parse_dates})
+        cached = cache.frames(cache_key)
 
-    print("Reading CSV in chunks...")
-    df_iter = pd.read_csv(
-        url,
-        iterator=True,
-        chunksize=chunksize,
-        dtype=dtype,
-        parse_dates=parse_dates
-    )
+    if cached is not None:
+        print("Reading parsed chunks from the cache...")
+        metrics.count('cache_hits')
+        df_iter = cached
+    elif parallel > 1:
+        print(f"Parsing CSV with {parallel} processes...")
+        df_iter = read_csv_parallel(url, parallel, dtype, parse_dates, metrics, chunksize)
+    else:
+        print("Reading CSV in chunks...")
+        raw = TimedReader(open_source(url))
+        source = TimedReader(gzip.GzipFile(fileobj=raw)) if url.endswith('.gz') else raw
+        df_iter = pd.read_csv(
+            source,
+            iterator=True,
+            chunksize=chunksize,
+            dtype=dtype,
+            parse_dates=parse_dates
+        )
+    if cache is not None and cached is None:
+        metrics.count('cache_misses')
+        df_iter = cache.tee(cache_key, df_iter)
+
+    zones = ZoneLookup.from_csv(zones_csv) if zones_csv else None
+    validator = None
+    if validate or quarantine:
+        validator = Validator('tpep_pickup_datetime', 'tpep_dropoff_datetime', quarantine_path=quarantine)
+    sampler = None
+    if sample:
+        print(f"Sampling {sample:.2%} of trips")
+        sampler = Sampler(sample, 'tpep_pickup_datetime', 'tpep_dropoff_datetime')
+    aggregate = None
+    if aggregate_table:
+        aggregate = MonthlyZoneRevenue(
+            'Yellow', 'tpep_pickup_datetime', source=source_name(url), zones=zones
+        )
+
+    sketches = None
+    if sketch_store:
+        sketches = Sketches('tpep_pickup_datetime', 'tpep_dropoff_datetime', source=source_name(url))
+    od = None
+    if od_store:
+        od = ODMatrix('tpep_pickup_datetime', 'tpep_dropoff_datetime', source=source_name(url), zones=zones)
 
     first = True
 
-    for df_chunk in tqdm(df_iter, desc="Ingesting"):
-        if first:
-            df_chunk.head(0).to_sql(name=table, con=engine, if_exists='replace')
-            first = False
-            print(f"Created table {table}")
+    with profiled(profile, 'ingest_data'):
+        chunk_start = time.perf_counter()
+        for df_chunk in tqdm(df_iter, desc="Ingesting"):
+            rows = len(df_chunk)
+            metrics.record('parse', time.perf_counter() - chunk_start, rows=rows)
+
+            if sampler is not None:
+                with metrics.stage('sample', rows=rows):
+                    df_chunk = sampler.sample(df_chunk, metrics)
+                rows = len(df_chunk)
+
+            if validator is not None:
+                with metrics.stage('validate', rows=rows):
+                    df_chunk, rejected = validator.check(df_chunk, metrics)
+                    validator.quarantine(rejected)
+                rows = len(df_chunk)
+
+            if zones is not None:
+                with metrics.stage('enrich', rows=rows):
+                    df_chunk = zones.enrich(df_chunk)
+
+            with metrics.stage('write', rows=rows):
+                if first:
+                    df_chunk.head(0).to_sql(name=table, con=engine, if_exists='replace')
+                    first = False
+                    print(f"Created table {table}")
+
+                df_chunk.to_sql(name=table, con=engine, if_exists='append')
+            print(f"Inserted {rows} rows")
+
+            if aggregate is not None:
+                with metrics.stage('aggregate', rows=rows):
+                    aggregate.update(df_chunk)
+
+            if sketches is not None:
+                with metrics.stage('sketches', rows=rows):
+                    sketches.update(df_chunk)
+
+            if od is not None:
+                with metrics.stage('od_matrix', rows=rows):
+                    od.update(df_chunk)
+
+            metrics.observe_chunk(time.perf_counter() - chunk_start)
+            chunk_start = time.perf_counter()
 
-        df_chunk.to_sql(name=table, con=engine, if_exists='append')
-        print(f"Inserted {len(df_chunk)} rows")
+        if aggregate is not None:
+            with metrics.stage('aggregate_flush'):
+                aggregate.flush(engine, aggregate_table)
+        if sketches is not None:
+            with metrics.stage('sketches_flush'):
+                sketches.flush(sketch_store)
+        if od is not None:
+            with metrics.stage('od_matrix_flush'):
+                od.flush(od_store)
 
+    if validator is not None:
+        validator.close()
+    if raw is not None:
+        metrics.record_reads('parse', raw, source)
     print("Ingestion finished!")
+    metrics.emit(metrics_json, prom_file)
 
 if __name__ == "__main__":
     ingest_data()
@@ -0,0 +1,59 @@
+"""Deterministic row sampling for fast dev ingests.
+
+Every trip gets a pseudo-random number from a hash of its own contents
+(pickup/dropoff time, locations, distance, amount), and a row is kept
+when that number is below the sampling fraction. The decision depends on
+the row alone, not on chunk boundaries, so the same source always yields
+the same sample, whatever --chunksize, --parallel or machine. Kept rows
+get a `sample_weight` of 1 / fraction, so weighted counts and sums
+estimate the full totals.
+"""
+import numpy as np
+import pandas as pd
+
+WEIGHT_COLUMN = "sample_weight"
+
+HASH_COLUMNS = ("dropoff", "PULocationID", "DOLocationID", "trip_distance", "total_amount")
+
+
+def _is_arrow(data):
+    return hasattr(data, "num_rows")
+
+
+def _column(data, column):
+    """A column as a pandas Series; timestamps as int64 nanoseconds so the unit doesn't change the hash."""
+    series = data.column(column).to_pandas() if _is_arrow(data) else data[column]
+    series = series.reset_index(drop=True)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.Series(series.to_numpy(dtype="datetime64[ns]").view(np.int64))
+    return series
+
+
+class Sampler:
+
+    def __init__(self, fraction, pickup_col, dropoff_col):
+        self.fraction = fraction
+        self.hash_columns = [pickup_col] + [
+            dropoff_col if column == "dropoff" else column for column in HASH_COLUMNS
+        ]
+
+    def uniform(self, data):
+        """One number in [0, 1) per row, derived only from the row's values."""
+        columns = data.schema.names if _is_arrow(data) else data.columns
+        keys = pd.DataFrame({c: _column(data, c) for c in self.hash_columns if c in columns})
+        hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+        return (hashes >> np.uint64(11)).astype(np.float64) / 2.0**53
+
+    def sample(self, data, metrics=None):
+        """Return the sampled rows of a DataFrame or Arrow table/batch, with weights."""
+        n = data.num_rows if _is_arrow(data) else len(data)
+        keep = self.uniform(data) < self.fraction if n else np.zeros(0, dtype=bool)
+        weight = np.full(int(keep.sum()), 1.0 / self.fraction)
+
+        if metrics is not None:
+            metrics.count("rows_sampled_out", n - keep.sum())
+        if _is_arrow(data):
+            import pyarrow as pa
+
+            return data.filter(pa.array(keep)).append_column(WEIGHT_COLUMN, pa.array(weight, pa.float64()))
+        return data[keep].assign(**{WEIGHT_COLUMN: weight})
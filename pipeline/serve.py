@@ -0,0 +1,292 @@
+"""Read-only HTTP API over the precomputed trip aggregates.
+
+Serves zone/month revenue, trip counts and payment mix from the views that
+`--aggregate-table` maintains (see aggregates.py): `<table>_monthly`, the
+shape of module-4's fct_monthly_zone_revenue, and
+`<table>_payment_mix_monthly`, the notebook's payment-mix query. Nothing
+scans the trip tables.
+
+Responses are kept in an in-process LRU cache. At most every --refresh
+seconds a request checks `<table>_loads`, which every aggregate flush
+stamps; after a new load the cache is dropped. Each response carries an
+ETag derived from the load generation and the request, so a client sending
+If-None-Match gets a bodiless 304 until the data changes.
+
+Endpoints (all take optional zone, month=YYYY-MM and service_type filters):
+  /revenue       one row per zone, month and service type
+  /trips         trip counts; by=month sums over zones
+  /payment-mix   trips and share per payment type
+  /health        load generation and cache counters
+
+Usage example:
+  python serve.py --table zone_revenue --http-port 8080
+  curl 'localhost:8080/revenue?zone=JFK+Airport&month=2021-01'
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import click
+
+from db import postgres_engine
+
+# TLC data dictionary codes; aggregates.py stores a missing payment type as -1
+PAYMENT_TYPES = {
+    -1: "Unknown",
+    0: "Flex Fare",
+    1: "Credit card",
+    2: "Cash",
+    3: "No charge",
+    4: "Dispute",
+    5: "Unknown",
+    6: "Voided trip",
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+class LRUCache:
+    """Thread-safe LRU of rendered response bodies."""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # Postgres returns SUM(bigint) as numeric
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+
+def _where(params):
+    """SQL filter and bound parameters for the zone/month/service_type query parameters."""
+    clauses, bound = [], {}
+    if 'zone' in params:
+        clauses.append("pickup_zone = :zone")
+        bound['zone'] = params['zone']
+    if 'month' in params:
+        try:
+            month = datetime.strptime(params['month'], '%Y-%m').date()
+        except ValueError:
+            raise BadRequest(f"month must be YYYY-MM, got {params['month']!r}")
+        clauses.append("revenue_month = :month")
+        bound['month'] = month.isoformat()
+    if 'service_type' in params:
+        clauses.append("service_type = :service_type")
+        bound['service_type'] = params['service_type']
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", bound
+
+
+class AggregateAPI:
+
+    def __init__(self, engine, table, cache_size=1024, refresh=2.0):
+        self.engine = engine
+        self.table = table
+        self.cache = LRUCache(cache_size)
+        self.refresh = refresh
+        self.lock = threading.Lock()
+        self.checked = 0.0
+        self.current = None
+        self.routes = {
+            '/revenue': self.revenue,
+            '/trips': self.trips,
+            '/payment-mix': self.payment_mix,
+        }
+
+    def _query(self, sql, bound=None):
+        from sqlalchemy import text
+
+        with self.engine.connect() as conn:
+            return [dict(row._mapping) for row in conn.execute(text(sql), bound or {})]
+
+    def generation(self, force=False):
+        """Identifier of the latest aggregate load; drops the cache when it changes."""
+        with self.lock:
+            if force or self.current is None or time.monotonic() - self.checked >= self.refresh:
+                row = self._query(f"SELECT COUNT(*) AS loads, MAX(loaded_at) AS latest FROM {self.table}_loads")[0]
+                current = f"{row['loads']}:{row['latest']}"
+                if current != self.current:
+                    self.cache.clear()
+                    self.current = current
+                self.checked = time.monotonic()
+            return self.current
+
+    def revenue(self, params):
+        where, bound = _where(params)
+        return self._query(f"""
+SELECT * FROM {self.table}_monthly {where}
+ORDER BY revenue_month, pickup_zone, service_type
+""", bound)
+
+    def trips(self, params):
+        by = params.get('by', 'zone')
+        if by not in ('zone', 'month'):
+            raise BadRequest(f"by must be zone or month, got {by!r}")
+        where, bound = _where(params)
+        keys = "revenue_month, service_type" + (", pickup_zone" if by == 'zone' else "")
+        return self._query(f"""
+SELECT {keys}, SUM(total_monthly_trips) AS trips
+FROM {self.table}_monthly {where}
+GROUP BY {keys}
+ORDER BY {keys}
+""", bound)
+
+    def payment_mix(self, params):
+        where, bound = _where(params)
+        rows = self._query(f"""
+SELECT payment_type, SUM(trips) AS trips, SUM(total_amount) AS total_amount
+FROM {self.table}_payment_mix_monthly {where}
+GROUP BY payment_type
+ORDER BY trips DESC
+""", bound)
+        total = sum(int(row['trips']) for row in rows)
+        for row in rows:
+            row['payment_name'] = PAYMENT_TYPES.get(row['payment_type'], "Unknown")
+            row['share'] = int(row['trips']) / total if total else None
+        return rows
+
+    def health(self):
+        return {
+            'table': self.table,
+            'generation': self.generation(),
+            'cache_entries': len(self.cache.entries),
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+        }
+
+    def respond(self, path, query, if_none_match=None):
+        """(status, headers, body) for a GET of `path` with the raw `query` string."""
+        if path == '/health':
+            return 200, {'Cache-Control': 'no-store'}, json.dumps(self.health()).encode()
+        handler = self.routes.get(path)
+        if handler is None:
+            return 404, {}, json.dumps({'error': f"Unknown path {path}", 'paths': sorted(self.routes)}).encode()
+
+        params = dict(parse_qsl(query))
+        generation = self.generation()
+        key = (generation, path, tuple(sorted(params.items())))
+        etag = '"' + hashlib.sha1(repr(key).encode()).hexdigest()[:20] + '"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return 304, headers, b''
+
+        body = self.cache.get(key)
+        if body is None:
+            try:
+                rows = handler(params)
+            except BadRequest as e:
+                return 400, {}, json.dumps({'error': str(e)}).encode()
+            body = json.dumps(rows, default=_json_default).encode()
+            if self.generation(force=True) != generation:
+                # A load landed while we queried; the rows may be from either side of it
+                return 200, {'Cache-Control': 'no-store'}, body
+            self.cache.put(key, body)
+        return 200, headers, body
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Keep-alive, so load tests measure the API rather than TCP setup; headers
+    # and body go out as separate writes, which Nagle would hold for the peer's delayed ACK
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        try:
+            status, headers, body = self.server.api.respond(
+                parsed.path, parsed.query, self.headers.get('If-None-Match'))
+        except Exception as e:
+            status, headers, body = 500, {}, json.dumps({'error': str(e)}).encode()
+        self.send_response(status)
+        if body:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.access_log:
+            super().log_message(format, *args)
+
+
+class APIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, api, access_log=False):
+        super().__init__(address, Handler)
+        self.api = api
+        self.access_log = access_log
+
+
+@click.command()
+@click.option('--user', default='root')
+@click.option('--password', default='root')
+@click.option('--host', default='localhost')
+@click.option('--port', default=5432, type=int)
+@click.option('--db', default='ny_taxi')
+@click.option('--table', default='zone_revenue', help='Aggregate table given to --aggregate-table when ingesting')
+@click.option('--bind', default='127.0.0.1', help='Address to listen on')
+@click.option('--http-port', default=8080, help='Port to listen on')
+@click.option('--cache-size', default=1024, help='Responses kept in the LRU cache')
+@click.option('--refresh', default=2.0, help='Seconds between checks for new aggregate loads')
+@click.option('--access-log', is_flag=True, help='Log every request to stderr')
+def serve(user, password, host, port, db, table, bind, http_port, cache_size, refresh, access_log):
+    from sqlalchemy import inspect
+
+    engine = postgres_engine(user, password, host, port, db)
+    missing = [name for name in (f"{table}_loads", f"{table}_payment_mix") if not inspect(engine).has_table(name)]
+    if missing:
+        raise click.ClickException(
+            f"{', '.join(missing)} not found; ingest with --aggregate-table {table} first"
+        )
+
+    api = AggregateAPI(engine, table, cache_size=cache_size, refresh=refresh)
+    print(f"Serving {table} aggregates (generation {api.generation()}) on http://{bind}:{http_port}")
+    server = APIServer((bind, http_port), api, access_log=access_log)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,316 @@
+"""Mergeable approximate sketches per (pickup zone, pickup day).
+
+Sketches is an ingest sink like MonthlyZoneRevenue. While chunks stream
+through it keeps two kinds of sketch for every zone and day:
+
+- HyperLogLog registers (2**HLL_PRECISION of them, ~1.6% standard error)
+  for distinct counts of DISTINCT_COLUMNS.
+- Log-bucketed quantile sketches in the style of DDSketch for
+  QUANTILE_METRICS. A value is counted in bucket ceil(log_gamma |x|), so
+  every quantile estimate is within RELATIVE_ACCURACY of the true value.
+
+Both are stored sparsely, with only touched registers and non-empty
+buckets, as small Parquet files under `<store>/distinct/` and
+`<store>/quantiles/`, one per source file. Merging is a max (HLL) or a sum
+(buckets), so SketchStore rolls zone-days up to weeks, months, boroughs
+or the whole store on demand, without touching the trips.
+
+Sampled chunks (see sample.py) add their sample_weight to the quantile
+buckets. Distinct counts cover the sampled rows only.
+
+Usage example:
+  python main.py trips --url yellow_tripdata_2021-01.csv.gz --sketch-store sketches
+  python sketches.py quantiles --store sketches --metric fare_amount --by borough --by month
+  python sketches.py distinct --store sketches --column VendorID --by month
+"""
+import math
+import os
+
+import click
+
+HLL_PRECISION = 12
+RELATIVE_ACCURACY = 0.01
+# Magnitudes below this land in the zero bucket
+MIN_VALUE = 1e-3
+
+DISTINCT_COLUMNS = ("VendorID", "DOLocationID")
+QUANTILE_METRICS = ("fare_amount", "trip_distance", "duration_min")
+
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+# Shift so every magnitude >= MIN_VALUE gets a key >= 1; negative values get negative keys
+KEY_SHIFT = -math.floor(math.log(MIN_VALUE, GAMMA)) + 1
+
+GROUPINGS = ("zone", "borough", "day", "week", "month")
+
+
+def hll_registers(values, precision=HLL_PRECISION):
+    """(register index, rank) for each value, from a 64-bit hash."""
+    import numpy as np
+    import pandas as pd
+
+    hashes = pd.util.hash_array(np.asarray(values))
+    register = (hashes >> np.uint64(64 - precision)).astype(np.int32)
+    rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+    # rank = leading zeros in the remaining bits + 1; frexp's exponent is floor(log2) + 1
+    exponent = np.frexp(rest.astype(np.float64))[1]
+    rank = np.where(rest == 0, 64 - precision + 1, 64 - precision + 1 - exponent)
+    return register, rank.astype(np.int8)
+
+
+def hll_estimate(registers, ranks, precision=HLL_PRECISION):
+    """Cardinality from the non-empty registers of one sketch."""
+    import numpy as np
+
+    m = 1 << precision
+    alpha = 0.7213 / (1 + 1.079 / m)
+    empty = m - len(registers)
+    estimate = alpha * m * m / (empty + np.sum(np.exp2(-np.asarray(ranks, dtype=np.float64))))
+    if estimate <= 2.5 * m and empty > 0:
+        return m * math.log(m / empty)
+    return estimate
+
+
+def bucket_keys(values):
+    import numpy as np
+
+    magnitude = np.abs(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        keys = np.ceil(np.log(magnitude) / math.log(GAMMA)) + KEY_SHIFT
+    keys = np.where(magnitude < MIN_VALUE, 0, keys)
+    return (np.sign(values) * keys).astype(np.int32)
+
+
+def bucket_values(keys):
+    """Representative value of each bucket (within RELATIVE_ACCURACY of anything in it)."""
+    import numpy as np
+
+    keys = np.asarray(keys)
+    magnitude = np.power(GAMMA, np.abs(keys) - KEY_SHIFT) * 2 / (1 + GAMMA)
+    return np.where(keys == 0, 0.0, np.sign(keys) * magnitude)
+
+
+def bucket_quantiles(keys, counts, qs):
+    """Quantiles from one sketch's (key, count) pairs."""
+    import numpy as np
+
+    order = np.argsort(keys)
+    keys, cumulative = np.asarray(keys)[order], np.cumsum(np.asarray(counts)[order])
+    ranks = np.asarray(qs) * (cumulative[-1] - 1)
+    return bucket_values(keys[np.searchsorted(cumulative, ranks, side="right").clip(max=len(keys) - 1)])
+
+
+class Sketches:
+
+    def __init__(self, pickup_col, dropoff_col, source,
+                 location_col="PULocationID", distinct_columns=DISTINCT_COLUMNS):
+        self.pickup_col = pickup_col
+        self.dropoff_col = dropoff_col
+        self.location_col = location_col
+        self.source = source
+        self.distinct_columns = distinct_columns
+        self.distinct = None
+        self.quantiles = None
+
+    def update(self, df):
+        import numpy as np
+        import pandas as pd
+        from sample import WEIGHT_COLUMN
+
+        pickup = df[self.pickup_col].to_numpy(dtype="datetime64[ns]")
+        keep = ~np.isnat(pickup)
+        location = df[self.location_col].to_numpy(dtype=np.int64, na_value=-1)[keep]
+        day = pickup[keep].astype("datetime64[D]")
+        if WEIGHT_COLUMN in df:
+            weight = df[WEIGHT_COLUMN].to_numpy(dtype=np.float64)[keep]
+        else:
+            weight = np.ones(keep.sum())
+
+        metrics = {
+            "duration_min": (df[self.dropoff_col].to_numpy(dtype="datetime64[ns]")[keep]
+                             - pickup[keep]).astype("timedelta64[s]").astype(np.float64) / 60,
+        }
+        for metric in QUANTILE_METRICS:
+            if metric in df:
+                metrics[metric] = df[metric].to_numpy(dtype=np.float64, na_value=np.nan)[keep]
+
+        parts = []
+        for metric, values in metrics.items():
+            valid = ~np.isnan(values)
+            parts.append(pd.DataFrame({
+                "location_id": location[valid], "day": day[valid], "metric": metric,
+                "key": bucket_keys(values[valid]), "count": weight[valid],
+            }))
+        part = pd.concat(parts).groupby(["location_id", "day", "metric", "key"]).sum()
+        self.quantiles = part if self.quantiles is None else self.quantiles.add(part, fill_value=0)
+
+        parts = []
+        for column in self.distinct_columns:
+            if column not in df:
+                continue
+            values = df[column].to_numpy(dtype=np.int64, na_value=-1)[keep]
+            valid = values >= 0
+            register, rank = hll_registers(values[valid])
+            parts.append(pd.DataFrame({
+                "location_id": location[valid], "day": day[valid], "column": column,
+                "register": register, "rank": rank,
+            }))
+        if parts:
+            part = pd.concat(parts).groupby(["location_id", "day", "column", "register"]).max()
+            if self.distinct is not None:
+                part = pd.concat([self.distinct, part]).groupby(level=[0, 1, 2, 3]).max()
+            self.distinct = part
+
+    def flush(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.quantiles is None:
+            print(f"No sketches built for {self.source}")
+            return
+        for kind, state in (("quantiles", self.quantiles), ("distinct", self.distinct)):
+            if state is None:
+                continue
+            os.makedirs(os.path.join(path, kind), exist_ok=True)
+            final = os.path.join(path, kind, f"{self.source}.parquet")
+            table = pa.Table.from_pandas(state.reset_index(), preserve_index=False)
+            table = table.set_column(table.schema.get_field_index("day"), "day", table.column("day").cast(pa.date32()))
+            pq.write_table(table, f"{final}.tmp", compression="zstd")
+            os.replace(f"{final}.tmp", final)
+        print(f"Wrote sketches for {self.source} ({len(self.quantiles)} quantile buckets, "
+              f"{0 if self.distinct is None else len(self.distinct)} HLL registers) to {path}")
+
+
+class SketchStore:
+
+    def __init__(self, path, zones=None):
+        self.path = path
+        self._zones = zones
+
+    @property
+    def zones(self):
+        if self._zones is None:
+            from zones import ZoneLookup
+
+            self._zones = ZoneLookup.from_csv()
+        return self._zones
+
+    def read(self, kind, start=None, end=None, **equals):
+        from datetime import date
+
+        import pyarrow.dataset as ds
+
+        directory = os.path.join(self.path, kind)
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"No {kind} sketches in {self.path}")
+        dataset = ds.dataset(directory, format="parquet")
+        condition = None
+        for name, value in equals.items():
+            condition = _and(condition, ds.field(name) == value)
+        if start:
+            condition = _and(condition, ds.field("day") >= date.fromisoformat(start))
+        if end:
+            condition = _and(condition, ds.field("day") < date.fromisoformat(end))
+        return dataset.to_table(filter=condition).to_pandas(date_as_object=False)
+
+    def group_keys(self, df, by):
+        import numpy as np
+        import pandas as pd
+
+        keys = {}
+        day = df["day"].to_numpy(dtype="datetime64[D]")
+        for grouping in by:
+            if grouping == "zone":
+                keys["zone"] = self.zones.zone(df["location_id"])
+            elif grouping == "borough":
+                keys["borough"] = self.zones.borough(df["location_id"])
+            elif grouping == "day":
+                keys["day"] = day
+            elif grouping == "week":
+                # Weeks start on Monday; 1970-01-01 was a Thursday
+                keys["week"] = day - ((day.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+            elif grouping == "month":
+                keys["month"] = day.astype("datetime64[M]")
+            else:
+                raise ValueError(f"Unknown grouping {grouping!r}, expected one of {GROUPINGS}")
+        return pd.DataFrame(keys, index=df.index)
+
+    def quantiles(self, metric, qs=(0.5, 0.95), by=("month",), start=None, end=None):
+        """Approximate quantiles of a metric per group, by merging zone-day sketches."""
+        import pandas as pd
+
+        df = self.read("quantiles", start, end, metric=metric)
+        keys = self.group_keys(df, by)
+        merged = df.groupby([*(keys[c] for c in keys), df["key"]], observed=True, dropna=False)["count"].sum()
+        rows = []
+        for group, buckets in merged.groupby(level=list(range(len(by))), observed=True, dropna=False):
+            group = group if isinstance(group, tuple) else (group,)
+            values = bucket_quantiles(buckets.index.get_level_values(-1), buckets.to_numpy(), qs)
+            rows.append([*group, buckets.sum(), *values])
+        return _named(pd.DataFrame(rows, columns=[*by, "trips", *(f"p{q * 100:g}" for q in qs)]), by)
+
+    def distinct(self, column, by=("month",), start=None, end=None):
+        """Approximate distinct counts of a column per group, by merging HLL registers."""
+        import pandas as pd
+
+        df = self.read("distinct", start, end, column=column)
+        keys = self.group_keys(df, by)
+        merged = df.groupby([*(keys[c] for c in keys), df["register"]], observed=True, dropna=False)["rank"].max()
+        rows = []
+        for group, ranks in merged.groupby(level=list(range(len(by))), observed=True, dropna=False):
+            group = group if isinstance(group, tuple) else (group,)
+            rows.append([*group, round(hll_estimate(ranks.index.get_level_values(-1), ranks.to_numpy()))])
+        return _named(pd.DataFrame(rows, columns=[*by, f"distinct_{column}"]), by)
+
+
+def _named(result, by):
+    """Zone ids missing from the lookup show up as Unknown."""
+    for column in ("zone", "borough"):
+        if column in by:
+            result[column] = result[column].astype(object).fillna("Unknown")
+    return result
+
+
+def _and(condition, term):
+    return term if condition is None else condition & term
+
+
+@click.group()
+def sketch():
+    """Approximate distinct counts and quantiles from zone-day sketches."""
+
+
+@sketch.command()
+@click.option('--store', default='sketches', help='Sketch store directory')
+@click.option('--metric', default='fare_amount', type=click.Choice(QUANTILE_METRICS))
+@click.option('--by', multiple=True, default=['month'], type=click.Choice(GROUPINGS), help='Roll up by, repeatable')
+@click.option('-q', 'qs', multiple=True, default=[0.5, 0.95], type=float, help='Quantile, repeatable')
+@click.option('--start', default=None, help='First pickup day (inclusive)')
+@click.option('--end', default=None, help='Last pickup day (exclusive)')
+def quantiles(store, metric, by, qs, start, end):
+    import time
+
+    begin = time.perf_counter()
+    result = SketchStore(store).quantiles(metric, qs, by, start, end)
+    elapsed = time.perf_counter() - begin
+    print(result.to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+    print(f"({elapsed * 1000:,.1f} ms)")
+
+
+@sketch.command()
+@click.option('--store', default='sketches', help='Sketch store directory')
+@click.option('--column', default='VendorID', type=click.Choice(DISTINCT_COLUMNS))
+@click.option('--by', multiple=True, default=['month'], type=click.Choice(GROUPINGS), help='Roll up by, repeatable')
+@click.option('--start', default=None, help='First pickup day (inclusive)')
+@click.option('--end', default=None, help='Last pickup day (exclusive)')
+def distinct(store, column, by, start, end):
+    import time
+
+    begin = time.perf_counter()
+    result = SketchStore(store).distinct(column, by, start, end)
+    elapsed = time.perf_counter() - begin
+    print(result.to_string(index=False))
+    print(f"({elapsed * 1000:,.1f} ms)")
+
+
+if __name__ == "__main__":
+    sketch()
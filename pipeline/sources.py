@@ -0,0 +1,63 @@
+"""Opening ingest sources (HTTP(S) URLs or local paths) as binary streams."""
+import os
+import time
+from urllib.parse import urlparse
+
+
+def is_local(url):
+    return urlparse(url).scheme in ("", "file")
+
+
+def local_path(url):
+    return urlparse(url).path if url.startswith("file://") else url
+
+
+def open_source(url):
+    if is_local(url):
+        return open(local_path(url), "rb")
+    import urllib.request
+
+    return urllib.request.urlopen(url)
+
+
+def source_name(url):
+    return os.path.basename(urlparse(url).path)
+
+
+class TimedReader:
+    """File-like wrapper that records time spent in, and bytes returned by, read()."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def _timed(self, read, size):
+        start = time.perf_counter()
+        data = read(size)
+        self.seconds += time.perf_counter() - start
+        self.bytes += len(data)
+        return data
+
+    def read(self, size=-1):
+        return self._timed(self.raw.read, size)
+
+    def read1(self, size=-1):
+        return self._timed(getattr(self.raw, "read1", self.raw.read), size)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self.raw.close()
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
@@ -0,0 +1,123 @@
+"""Row-level data quality checks applied to each chunk during ingestion.
+
+The rules mirror the checks that used to run downstream (the Bruin staging
+asset's not_null/non_negative/dropoff_after_pickup checks and the dbt
+staging `vendorid is not null` filter). Each rule is a vectorized mask over
+the chunk. Rows failing any rule are dropped from the load and, with a
+quarantine path, written to a Parquet file with a `reject_reason` column
+holding the first rule they failed.
+"""
+import numpy as np
+
+REASON_COLUMN = "reject_reason"
+
+
+def _is_arrow(data):
+    return hasattr(data, "num_rows")
+
+
+def _isnull(data, column):
+    if _is_arrow(data):
+        import pyarrow.compute as pc
+
+        return pc.is_null(data.column(column)).to_numpy(zero_copy_only=False)
+    return data[column].isna().to_numpy()
+
+
+def _values(data, column, dtype=None):
+    if _is_arrow(data):
+        values = data.column(column).to_numpy(zero_copy_only=False)
+        return values.astype(dtype) if dtype else values
+    if dtype:
+        return data[column].to_numpy(dtype=dtype, na_value=np.nan)
+    return data[column].to_numpy()
+
+
+def _less(data, left, right):
+    """left < right, with nulls (NaN/NaT) comparing False."""
+    a, b = _values(data, left), _values(data, right)
+    with np.errstate(invalid="ignore"):
+        return np.asarray(a < b, dtype=bool)
+
+
+def _negative(data, column):
+    values = _values(data, column, "float64")
+    with np.errstate(invalid="ignore"):
+        return values < 0
+
+
+class Validator:
+
+    def __init__(self, pickup_col, dropoff_col, quarantine_path=None,
+                 pu_col="PULocationID", do_col="DOLocationID"):
+        self.pickup_col = pickup_col
+        self.dropoff_col = dropoff_col
+        self.pu_col = pu_col
+        self.do_col = do_col
+        self.quarantine_path = quarantine_path
+        self.writer = None
+        self.schema = None
+
+    def rules(self, columns):
+        """(reason code, mask function) for every rule whose columns are present."""
+        rules = [
+            ("pickup_null", [self.pickup_col], lambda d: _isnull(d, self.pickup_col)),
+            ("dropoff_null", [self.dropoff_col], lambda d: _isnull(d, self.dropoff_col)),
+            ("pickup_location_null", [self.pu_col], lambda d: _isnull(d, self.pu_col)),
+            ("dropoff_location_null", [self.do_col], lambda d: _isnull(d, self.do_col)),
+            ("vendor_null", ["VendorID"], lambda d: _isnull(d, "VendorID")),
+            ("dropoff_not_after_pickup", [self.pickup_col, self.dropoff_col],
+             lambda d: _less(d, self.dropoff_col, self.pickup_col)
+             | (_values(d, self.dropoff_col) == _values(d, self.pickup_col))),
+        ]
+        for column in ("trip_distance", "fare_amount", "total_amount"):
+            rules.append((f"negative_{column}", [column], lambda d, c=column: _negative(d, c)))
+        return [(name, mask) for name, needed, mask in rules if all(c in columns for c in needed)]
+
+    def check(self, data, metrics=None):
+        """Return (passing rows, failing rows); failing rows carry a reject reason.
+
+        Works on pandas DataFrames and Arrow tables/record batches alike.
+        """
+        columns = data.schema.names if _is_arrow(data) else data.columns
+        n = data.num_rows if _is_arrow(data) else len(data)
+        reason = np.full(n, "", dtype=object)
+        for name, mask in self.rules(columns):
+            failed = mask(data)
+            if metrics is not None:
+                metrics.count(f"rejected_{name}", failed.sum())
+            reason[failed & (reason == "")] = name
+        bad = reason != ""
+        if metrics is not None:
+            metrics.count("rejected_rows", bad.sum())
+        if not bad.any():
+            return data, None
+
+        if _is_arrow(data):
+            import pyarrow as pa
+
+            rejected = data.filter(pa.array(bad)).append_column(REASON_COLUMN, pa.array(reason[bad], pa.string()))
+            return data.filter(pa.array(~bad)), rejected
+        rejected = data[bad].assign(**{REASON_COLUMN: reason[bad]})
+        return data[~bad], rejected
+
+    def quarantine(self, rejected):
+        """Append failing rows to the quarantine Parquet file, if one was given."""
+        if rejected is None or self.quarantine_path is None:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not _is_arrow(rejected):
+            rejected = pa.Table.from_pandas(rejected, schema=self.schema, preserve_index=False)
+        elif isinstance(rejected, pa.RecordBatch):
+            rejected = pa.Table.from_batches([rejected])
+        if self.writer is None:
+            self.schema = rejected.schema
+            self.writer = pq.ParquetWriter(self.quarantine_path, self.schema, compression="zstd")
+        self.writer.write_table(rejected.cast(self.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
@@ -0,0 +1,159 @@
+"""Continuously ingest trip files as they land in a directory.
+
+New `*_tripdata_*` files are picked up via inotify (if inotify_simple is
+installed) or by polling. A file is considered complete once its size and
+mtime have stayed the same for --settle seconds, and is then handed to the
+matching ingest command in a subprocess, with at most --workers running at
+once. Extra arguments after `--` are passed through to the ingest command.
+The database password reaches the subprocess as $PGPASSWORD, not on its
+command line.
+
+Routed: yellow CSV (.csv/.csv.gz) to `trips`, green Parquet to `green`.
+Other trip files (yellow Parquet, green CSV, FHV) have no loader yet and
+are logged as skipped.
+
+Usage example:
+  python watch.py --dir landing --workers 2 -- --zones-csv taxi_zone_lookup.csv
+"""
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+# File name pattern -> pipeline subcommand that ingests it
+ROUTES = [
+    (re.compile(r"^green_tripdata_.+\.parquet$"), "green"),
+    (re.compile(r"^yellow_tripdata_.+\.csv(\.gz)?$"), "trips"),
+]
+
+
+# Any trip file the TLC publishes, routed or not
+TRIP_FILE = re.compile(r"^[a-z]+_tripdata_.+\.(parquet|csv(\.gz)?)$")
+
+
+def route(name):
+    return next((command for pattern, command in ROUTES if pattern.match(name)), None)
+
+
+def table_name(name):
+    """green_tripdata_2025-11.parquet -> green_tripdata_2025_11"""
+    return name.split(".", 1)[0].replace("-", "_")
+
+
+class Debouncer:
+    """Report files whose size and mtime have been stable for `settle` seconds."""
+
+    def __init__(self, settle):
+        self.settle = settle
+        self.pending = {}
+        self.done = {}
+
+    def touch(self, path):
+        if path not in self.pending:
+            self.pending[path] = (None, time.monotonic(), time.monotonic())
+
+    def ready(self):
+        now = time.monotonic()
+        for path, (signature, since, first_seen) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[path]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != signature:
+                self.pending[path] = (current, now, first_seen)
+            elif now - since >= self.settle:
+                del self.pending[path]
+                if self.done.get(path) != current:
+                    self.done[path] = current
+                    yield path, now - first_seen
+
+
+def events(directory, poll):
+    """Yield batches of candidate file names: inotify events, or a directory scan per poll."""
+    try:
+        from inotify_simple import INotify, flags
+    except ImportError:
+        INotify = None
+
+    if INotify is None:
+        print(f"Polling {directory} every {poll}s (install inotify_simple for event-driven watching)")
+        while True:
+            yield [entry.name for entry in os.scandir(directory) if entry.is_file()]
+            time.sleep(poll)
+
+    inotify = INotify()
+    inotify.add_watch(directory, flags.CREATE | flags.MODIFY | flags.CLOSE_WRITE | flags.MOVED_TO)
+    print(f"Watching {directory} with inotify")
+    # Files that were already there before we started
+    yield [entry.name for entry in os.scandir(directory) if entry.is_file()]
+    while True:
+        yield [event.name for event in inotify.read(timeout=int(poll * 1000))]
+
+
+def run_ingest(path, command, options, password, extra_args):
+    args = [sys.executable, MAIN, command, "--url", path, "--table", table_name(os.path.basename(path))]
+    for name, value in options.items():
+        args += [f"--{name}", str(value)]
+    # Through the environment, so it doesn't show up in ps or /proc/<pid>/cmdline
+    env = {**os.environ, "PGPASSWORD": password}
+    start = time.perf_counter()
+    result = subprocess.run([*args, *extra_args], capture_output=True, text=True, env=env)
+    return result, time.perf_counter() - start
+
+
+@click.command(context_settings={"ignore_unknown_options": True})
+@click.option('--user', default='root')
+@click.option('--password', default='root', envvar='PGPASSWORD', help='Also read from $PGPASSWORD')
+@click.option('--host', default='localhost')
+@click.option('--port', default=5432, type=int)
+@click.option('--db', default='ny_taxi')
+@click.option('--dir', 'directory', default='landing', help='Landing directory to watch')
+@click.option('--workers', default=2, help='Maximum concurrent ingests')
+@click.option('--settle', default=2.0, help='Seconds a file must stay unchanged before it is ingested')
+@click.option('--poll', default=1.0, help='Polling interval / inotify read timeout in seconds')
+@click.option('--once', is_flag=True, help='Ingest the files already present, then exit')
+@click.argument('extra_args', nargs=-1, type=click.UNPROCESSED)
+def watch(user, password, host, port, db, directory, workers, settle, poll, once, extra_args):
+    options = {"user": user, "host": host, "port": port, "db": db}
+    debouncer = Debouncer(settle)
+    skipped = set()
+    os.makedirs(directory, exist_ok=True)
+
+    def finished(path, waited):
+        def report(future):
+            result, seconds = future.result()
+            status = "ingested" if result.returncode == 0 else f"FAILED ({result.returncode})"
+            print(f"{os.path.basename(path)} {status} in {seconds:.1f}s "
+                  f"({waited + seconds:.1f}s after it was first seen)")
+            if result.returncode != 0:
+                print(result.stderr[-2000:])
+        return report
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for names in events(directory, poll):
+            for name in names:
+                if route(name):
+                    debouncer.touch(os.path.join(directory, name))
+                elif TRIP_FILE.match(name) and name not in skipped:
+                    skipped.add(name)
+                    print(f"Skipping {name}: no loader for this service and format")
+            for path, waited in debouncer.ready():
+                command = route(os.path.basename(path))
+                print(f"Dispatching {os.path.basename(path)} to `{command}`")
+                pool.submit(run_ingest, path, command, options, password, extra_args).add_done_callback(
+                    finished(path, waited)
+                )
+            if once and not debouncer.pending:
+                break
+
+
+if __name__ == "__main__":
+    watch()
@@ -0,0 +1,61 @@
+"""Taxi zone lookup held as dense NumPy arrays indexed by LocationID.
+
+Used by the ingest scripts to attach borough/zone names to trip chunks
+without a pandas merge: the lookup CSV is read once, and every chunk is
+enriched by plain array indexing into dictionary-encoded categoricals.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_ZONES_CSV = Path(__file__).with_name("taxi_zone_lookup.csv")
+
+
+class ZoneLookup:
+
+    def __init__(self, location_ids, boroughs, zones):
+        self.size = int(location_ids.max()) + 1
+
+        # One categories array per attribute, plus a dense LocationID -> code
+        # table. Unknown / missing ids map to code -1, i.e. a null categorical.
+        self.borough_categories, borough_codes = np.unique(boroughs, return_inverse=True)
+        self.zone_categories, zone_codes = np.unique(zones, return_inverse=True)
+
+        self.borough_codes = np.full(self.size, -1, dtype=np.int16)
+        self.zone_codes = np.full(self.size, -1, dtype=np.int16)
+        self.borough_codes[location_ids] = borough_codes
+        self.zone_codes[location_ids] = zone_codes
+
+    @classmethod
+    def from_csv(cls, path=DEFAULT_ZONES_CSV):
+        df = pd.read_csv(path, sep=None, engine="python")
+        df.columns = [c.lower() for c in df.columns]
+        return cls(
+            df["locationid"].to_numpy(dtype=np.int64),
+            df["borough"].fillna("Unknown").to_numpy(dtype=object),
+            df["zone"].fillna("Unknown").to_numpy(dtype=object),
+        )
+
+    def codes(self, location_ids, table):
+        """Map a LocationID column to category codes (-1 for null/unknown)."""
+        ids = pd.array(location_ids, dtype="Int64").to_numpy(dtype=np.int64, na_value=-1)
+        valid = (ids >= 0) & (ids < self.size)
+        return np.where(valid, table[np.where(valid, ids, 0)], -1)
+
+    def borough(self, location_ids):
+        codes = self.codes(location_ids, self.borough_codes)
+        return pd.Categorical.from_codes(codes, categories=self.borough_categories)
+
+    def zone(self, location_ids):
+        codes = self.codes(location_ids, self.zone_codes)
+        return pd.Categorical.from_codes(codes, categories=self.zone_categories)
+
+    def enrich(self, df, pickup_col="PULocationID", dropoff_col="DOLocationID"):
+        """Add pickup_/dropoff_ borough and zone columns to a trip chunk."""
+        for prefix, col in (("pickup", pickup_col), ("dropoff", dropoff_col)):
+            if col not in df.columns:
+                continue
+            df[f"{prefix}_borough"] = self.borough(df[col])
+            df[f"{prefix}_zone"] = self.zone(df[col])
+        return df
@@ -21,7 +21,18 @@ def _(duckdb):
 
 @app.cell
 def _(conn):
-    row_count = conn.execute("SELECT COUNT(*) AS total_rows FROM taxi_data.trips").df()
+    # Query results below are cached on disk per completed dlt load, so
+    # re-opening the notebook only re-runs them after a new load
+    latest_load_id = conn.execute(
+        "SELECT MAX(load_id) FROM taxi_data._dlt_loads WHERE status = 0"
+    ).fetchone()[0]
+    return (latest_load_id,)
+
+
+@app.cell
+def _(conn, latest_load_id, mo):
+    with mo.persistent_cache(name=f"row_count_{latest_load_id}"):
+        row_count = conn.execute("SELECT COUNT(*) AS total_rows FROM taxi_data.trips").df()
     return (row_count,)
 
 
@@ -32,15 +43,16 @@ def _(mo, row_count):
 
 
 @app.cell
-def _(conn):
-    date_range = conn.execute(
-        """
-        SELECT
-            MIN(trip_pickup_date_time) AS min_pickup,
-            MAX(trip_pickup_date_time) AS max_pickup
-        FROM taxi_data.trips
-        """
-    ).df()
+def _(conn, latest_load_id, mo):
+    with mo.persistent_cache(name=f"date_range_{latest_load_id}"):
+        date_range = conn.execute(
+            """
+            SELECT
+                MIN(trip_pickup_date_time) AS min_pickup,
+                MAX(trip_pickup_date_time) AS max_pickup
+            FROM taxi_data.trips
+            """
+        ).df()
     return (date_range,)
 
 
@@ -57,18 +69,19 @@ def _(date_range, mo):
 
 
 @app.cell
-def _(conn):
-    monthly_trips = conn.execute(
-        """
-        SELECT
-            DATE_TRUNC('month', trip_pickup_date_time) AS pickup_month,
-            COUNT(*) AS trips
-        FROM taxi_data.trips
-        WHERE trip_pickup_date_time IS NOT NULL
-        GROUP BY 1
-        ORDER BY 1
-        """
-    ).df()
+def _(conn, latest_load_id, mo):
+    with mo.persistent_cache(name=f"monthly_trips_{latest_load_id}"):
+        monthly_trips = conn.execute(
+            """
+            SELECT
+                DATE_TRUNC('month', trip_pickup_date_time) AS pickup_month,
+                COUNT(*) AS trips
+            FROM taxi_data.trips
+            WHERE trip_pickup_date_time IS NOT NULL
+            GROUP BY 1
+            ORDER BY 1
+            """
+        ).df()
     return (monthly_trips,)
 
 
@@ -94,17 +107,18 @@ def _(monthly_chart):
 
 
 @app.cell
-def _(conn):
-    payment_mix = conn.execute(
-        """
-        SELECT
-            COALESCE(payment_type, 'UNKNOWN') AS payment_type,
-            COUNT(*) AS trips
-        FROM taxi_data.trips
-        GROUP BY 1
-        ORDER BY trips DESC
-        """
-    ).df()
+def _(conn, latest_load_id, mo):
+    with mo.persistent_cache(name=f"payment_mix_{latest_load_id}"):
+        payment_mix = conn.execute(
+            """
+            SELECT
+                COALESCE(payment_type, 'UNKNOWN') AS payment_type,
+                COUNT(*) AS trips
+            FROM taxi_data.trips
+            GROUP BY 1
+            ORDER BY trips DESC
+            """
+        ).df()
     return (payment_mix,)
 
 
@@ -130,22 +144,23 @@ def _(payment_chart):
 
 
 @app.cell
-def _(conn):
-    sample_rows = conn.execute(
-        """
-        SELECT
-            vendor_name,
-            trip_pickup_date_time,
-            trip_dropoff_date_time,
-            trip_distance,
-            fare_amt,
-            tip_amt,
-            total_amt
-        FROM taxi_data.trips
-        ORDER BY trip_pickup_date_time DESC NULLS LAST
-        LIMIT 10
-        """
-    ).df()
+def _(conn, latest_load_id, mo):
+    with mo.persistent_cache(name=f"sample_rows_{latest_load_id}"):
+        sample_rows = conn.execute(
+            """
+            SELECT
+                vendor_name,
+                trip_pickup_date_time,
+                trip_dropoff_date_time,
+                trip_distance,
+                fare_amt,
+                tip_amt,
+                total_amt
+            FROM taxi_data.trips
+            ORDER BY trip_pickup_date_time DESC NULLS LAST
+            LIMIT 10
+            """
+        ).df()
     return (sample_rows,)
 
 